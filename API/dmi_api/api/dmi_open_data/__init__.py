@@ -2,15 +2,20 @@
 
 __version__ = "0.1.1"
 
+from dmi_open_data.async_client import AsyncDMIOpenDataClient
 from dmi_open_data.client import DMIOpenDataClient
 from dmi_open_data.enums import Parameter, ClimateDataParameter
-from dmi_open_data.utils import microseconds2date, date2microseconds
+from dmi_open_data.station_index import StationIndex
+from dmi_open_data.utils import microseconds2date, date2microseconds, distances
 
 
 __all__ = [
+    "AsyncDMIOpenDataClient",
     "ClimateDataParameter",
     "DMIOpenDataClient",
     "Parameter",
+    "StationIndex",
     "microseconds2date",
     "date2microseconds",
+    "distances",
 ]
@@ -0,0 +1,442 @@
+import asyncio
+from collections import deque
+from datetime import datetime
+from typing import List, Dict, Optional, Any, Iterable, AsyncIterator, Union
+
+from tenacity import retry, stop_after_attempt, wait_random
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from dmi_open_data.client import DMIOpenDataClient, _construct_datetime_argument
+from dmi_open_data.enums import Parameter, ClimateDataParameter
+from dmi_open_data.station_index import StationIndex
+
+
+class AsyncDMIOpenDataClient:
+    """asyncio client for the DMI Open Data API, for running many queries at once.
+
+    The methods mirror `DMIOpenDataClient` as coroutines. All requests share one aiohttp
+    connection pool, at most `max_concurrency` requests are in flight at a time, and failed
+    requests are retried like `DMIOpenDataClient._query`. Requires the optional aiohttp
+    dependency: `pip install dmi-open-data[async]`.
+
+    Example:
+        async with AsyncDMIOpenDataClient(api_key=api_key) as client:
+            results = await client.gather("get_climate_data", queries)
+    """
+
+    _base_url = DMIOpenDataClient._base_url
+
+    def __init__(
+        self,
+        api_key: str,
+        version: str = "v2",
+        max_concurrency: int = 20,
+        pool_size: int = 20,
+        connect_timeout: float = 10,
+        read_timeout: float = 60,
+    ):
+        """
+        Args:
+            api_key (str): DMI API key.
+            version (str, optional): API version. Defaults to "v2".
+            max_concurrency (int, optional): Maximum number of requests in flight. Defaults to 20.
+            pool_size (int, optional): Maximum number of pooled connections. Defaults to 20.
+            connect_timeout (float, optional): Connection timeout in seconds. Defaults to 10.
+            read_timeout (float, optional): Read timeout in seconds. Defaults to 60.
+        """
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncDMIOpenDataClient requires aiohttp. Install it with `pip install dmi-open-data[async]`"
+            )
+        if api_key is None:
+            raise ValueError(f"Invalid value for `api_key`: {api_key}")
+        if version == "v1":
+            raise ValueError(f"DMI metObs v1 not longer supported")
+        if version not in ["v2"]:
+            raise ValueError(f"API version {version} not supported")
+
+        self.api_key = api_key
+        self.version = version
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+
+        self._session = None
+        self._semaphore = None
+        self._station_index = None
+
+    @property
+    def session(self) -> "aiohttp.ClientSession":
+        # Created on first use, as aiohttp sessions must be created inside the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self.timeout,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def close(self):
+        """Close the pooled connections of the client."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def base_url(self, api: str):
+        if api not in ("climateData", "metObs"):
+            raise NotImplementedError(f"Following api is not supported yet: {api}")
+        return self._base_url.format(version=self.version, api=api)
+
+    @retry(stop=stop_after_attempt(10), wait=wait_random(min=0.1, max=1.00))
+    async def _query(self, api: str, service: str, params: Dict[str, Any], **kwargs):
+        session = self.session
+        async with self._semaphore:
+            async with session.get(
+                url=f"{self.base_url(api=api)}/{service}",
+                params={
+                    key: value
+                    for key, value in {"api-key": self.api_key, **params}.items()
+                    if value is not None
+                },
+                **kwargs,
+            ) as res:
+                data = await res.json(content_type=None)
+
+        http_status_code = data.get("http_status_code", 200)
+        if http_status_code != 200:
+            message = data.get("message")
+            raise ValueError(
+                f"Failed HTTP request with HTTP status code {http_status_code} and message: {message}"
+            )
+        return data
+
+    async def get_stations(
+        self, limit: Optional[int] = 10000, offset: Optional[int] = 0
+    ) -> List[Dict[str, Any]]:
+        """Get DMI stations. See `DMIOpenDataClient.get_stations`."""
+        res = await self._query(
+            api="metObs",
+            service="collections/station/items",
+            params={
+                "limit": limit,
+                "offset": offset,
+            },
+        )
+        return res.get("features", [])
+
+    async def get_observations(
+        self,
+        parameter: Optional[Parameter] = None,
+        station_id: Optional[int] = None,
+        from_time: Optional[datetime] = None,
+        to_time: Optional[datetime] = None,
+        limit: Optional[int] = 10000,
+        offset: Optional[int] = 0,
+    ) -> List[Dict[str, Any]]:
+        """Get raw DMI observation. See `DMIOpenDataClient.get_observations`."""
+        res = await self._query(
+            api="metObs",
+            service="collections/observation/items",
+            params={
+                "parameterId": None if parameter is None else parameter.value,
+                "stationId": station_id,
+                "datetime": _construct_datetime_argument(
+                    from_time=from_time, to_time=to_time
+                ),
+                "limit": limit,
+                "offset": offset,
+            },
+        )
+        return res.get("features", [])
+
+    async def get_climate_data(
+        self,
+        parameter: Optional[ClimateDataParameter] = None,
+        station_id: Optional[int] = None,
+        from_time: Optional[datetime] = None,
+        to_time: Optional[datetime] = None,
+        time_resolution: Optional[str] = None,
+        limit: Optional[int] = 10000,
+        offset: Optional[int] = 0,
+    ) -> List[Dict[str, Any]]:
+        """Get raw DMI climate data. See `DMIOpenDataClient.get_climate_data`."""
+        res = await self._query(
+            api="climateData",
+            service="collections/stationValue/items",
+            params={
+                "parameterId": None if parameter is None else parameter.value,
+                "stationId": station_id,
+                "datetime": _construct_datetime_argument(
+                    from_time=from_time, to_time=to_time
+                ),
+                "timeResolution": time_resolution,
+                "limit": limit,
+                "offset": offset,
+            },
+        )
+        return res.get("features", [])
+
+    async def get_grid_values(
+        self,
+        parameter: Optional[Union[ClimateDataParameter, str]] = None,
+        cell_id: Optional[str] = None,
+        from_time: Optional[datetime] = None,
+        to_time: Optional[datetime] = None,
+        time_resolution: Optional[str] = None,
+        grid: str = "10km",
+        limit: Optional[int] = 10000,
+        offset: Optional[int] = 0,
+    ) -> List[Dict[str, Any]]:
+        """Get one page of raw DMI climate grid values. See `DMIOpenDataClient.iter_grid_values`."""
+        res = await self._query(
+            api="climateData",
+            service=f"collections/{grid}GridValue/items",
+            params={
+                "parameterId": getattr(parameter, "value", parameter),
+                "cellId": cell_id,
+                "datetime": _construct_datetime_argument(
+                    from_time=from_time, to_time=to_time
+                ),
+                "timeResolution": time_resolution,
+                "limit": limit,
+                "offset": offset,
+            },
+        )
+        return res.get("features", [])
+
+    def iter_stations(
+        self, page_size: int = 10000, max_workers: int = 4
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over all DMI stations, fetching pages automatically.
+        See `DMIOpenDataClient.iter_stations`."""
+        return self._iter_pages(
+            api="metObs",
+            service="collections/station/items",
+            params={},
+            page_size=page_size,
+            max_workers=max_workers,
+        )
+
+    def iter_observations(
+        self,
+        parameter: Optional[Parameter] = None,
+        station_id: Optional[int] = None,
+        from_time: Optional[datetime] = None,
+        to_time: Optional[datetime] = None,
+        page_size: int = 10000,
+        max_workers: int = 4,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over all raw DMI observations matching a query, fetching pages automatically.
+        See `DMIOpenDataClient.iter_observations`."""
+        return self._iter_pages(
+            api="metObs",
+            service="collections/observation/items",
+            params={
+                "parameterId": None if parameter is None else parameter.value,
+                "stationId": station_id,
+                "datetime": _construct_datetime_argument(
+                    from_time=from_time, to_time=to_time
+                ),
+            },
+            page_size=page_size,
+            max_workers=max_workers,
+        )
+
+    def iter_climate_data(
+        self,
+        parameter: Optional[ClimateDataParameter] = None,
+        station_id: Optional[int] = None,
+        from_time: Optional[datetime] = None,
+        to_time: Optional[datetime] = None,
+        time_resolution: Optional[str] = None,
+        page_size: int = 10000,
+        max_workers: int = 4,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over all raw DMI climate data matching a query, fetching pages automatically.
+        See `DMIOpenDataClient.iter_climate_data`."""
+        return self._iter_pages(
+            api="climateData",
+            service="collections/stationValue/items",
+            params={
+                "parameterId": None if parameter is None else parameter.value,
+                "stationId": station_id,
+                "datetime": _construct_datetime_argument(
+                    from_time=from_time, to_time=to_time
+                ),
+                "timeResolution": time_resolution,
+            },
+            page_size=page_size,
+            max_workers=max_workers,
+        )
+
+    def iter_grid_values(
+        self,
+        parameter: Optional[Union[ClimateDataParameter, str]] = None,
+        cell_id: Optional[str] = None,
+        from_time: Optional[datetime] = None,
+        to_time: Optional[datetime] = None,
+        time_resolution: Optional[str] = None,
+        grid: str = "10km",
+        page_size: int = 10000,
+        max_workers: int = 4,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over all raw DMI climate grid values matching a query, fetching pages automatically.
+        See `DMIOpenDataClient.iter_grid_values`.
+
+        Example:
+            async for feature in client.iter_grid_values("pot_evaporation_makkink", cell_id="10km_615_66"):
+                ...
+        """
+        return self._iter_pages(
+            api="climateData",
+            service=f"collections/{grid}GridValue/items",
+            params={
+                "parameterId": getattr(parameter, "value", parameter),
+                "cellId": cell_id,
+                "datetime": _construct_datetime_argument(
+                    from_time=from_time, to_time=to_time
+                ),
+                "timeResolution": time_resolution,
+            },
+            page_size=page_size,
+            max_workers=max_workers,
+        )
+
+    async def _iter_pages(
+        self,
+        api: str,
+        service: str,
+        params: Dict[str, Any],
+        page_size: int = 10000,
+        max_workers: int = 4,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over the features of all pages of a query. See `DMIOpenDataClient._iter_pages`.
+
+        When the first page reports `numberMatched`, the remaining pages are fetched as concurrent
+        tasks, with at most `max_workers` pages in flight, and yielded in order. Otherwise pages are
+        fetched one after another until a page is not full.
+        """
+
+        async def fetch(offset: int) -> List[Dict[str, Any]]:
+            res = await self._query(
+                api=api,
+                service=service,
+                params={**params, "limit": page_size, "offset": offset},
+            )
+            return res.get("features", [])
+
+        res = await self._query(
+            api=api, service=service, params={**params, "limit": page_size, "offset": 0}
+        )
+        features = res.get("features", [])
+        for feature in features:
+            yield feature
+
+        number_matched = res.get("numberMatched")
+        if not isinstance(number_matched, int) or max_workers < 2:
+            offset = len(features)
+            while len(features) == page_size:
+                features = await fetch(offset)
+                for feature in features:
+                    yield feature
+                offset += len(features)
+            return
+
+        offsets = iter(range(page_size, number_matched, page_size))
+        pending = deque(
+            asyncio.ensure_future(fetch(offset))
+            for _, offset in zip(range(max_workers), offsets)
+        )
+        try:
+            while pending:
+                features = await pending.popleft()
+                for offset in offsets:
+                    pending.append(asyncio.ensure_future(fetch(offset)))
+                    break
+                for feature in features:
+                    yield feature
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def list_parameters(self) -> List[Dict[str, Any]]:
+        """List available observation parameters. See `DMIOpenDataClient.list_parameters`."""
+        return [
+            {
+                "name": parameter.name,
+                "value": parameter.value,
+                "enum": parameter,
+            }
+            for parameter in Parameter
+        ]
+
+    @staticmethod
+    def get_parameter(parameter_id: str) -> Parameter:
+        """Get parameter enum from DMI parameter id."""
+        return Parameter(parameter_id)
+
+    async def get_station_index(self, refresh: bool = False) -> StationIndex:
+        """Get a spatial index over all DMI stations, kept in memory for the lifetime of the client."""
+        if refresh or self._station_index is None:
+            self._station_index = StationIndex(await self.get_stations())
+        return self._station_index
+
+    async def get_closest_station(
+        self, latitude: float, longitude: float
+    ) -> Dict[str, Any]:
+        """Get closest weather station from given coordinates."""
+        closest = await self.get_closest_stations(latitude=latitude, longitude=longitude, k=1)
+        return closest[0] if closest else None
+
+    async def get_closest_stations(
+        self, latitude: float, longitude: float, k: int = 1
+    ) -> List[Dict[str, Any]]:
+        """Get the k closest weather stations from given coordinates, closest first."""
+        index = await self.get_station_index()
+        return [station for station, _ in index.query(latitude, longitude, k=k)]
+
+    async def get_stations_within(
+        self, latitude: float, longitude: float, radius_km: float
+    ) -> List[Dict[str, Any]]:
+        """Get weather stations within a radius of given coordinates, closest first."""
+        index = await self.get_station_index()
+        return [
+            station
+            for station, _ in index.query_radius(latitude, longitude, radius_km=radius_km)
+        ]
+
+    async def gather(
+        self, method: str, queries: Iterable[Dict[str, Any]]
+    ) -> List[Any]:
+        """Run many queries of one method concurrently.
+
+        Iterating methods, such as "iter_grid_values", are collected into a list per query.
+        The first exception raised by a query is raised by gather.
+
+        Args:
+            method (str): Name of a query method, e.g. "get_climate_data".
+            queries (Iterable[Dict[str, Any]]): Keyword arguments of each query, e.g. one per
+                parameter, station and period.
+
+        Returns:
+            List[Any]: Results in the order of the queries.
+        """
+        query_method = getattr(self, method)
+
+        async def run(query: Dict[str, Any]) -> Any:
+            result = query_method(**query)
+            if hasattr(result, "__aiter__"):
+                return [item async for item in result]
+            return await result
+
+        return await asyncio.gather(*(run(query) for query in queries))
@@ -1,17 +1,72 @@
-from datetime import datetime
-from typing import List, Dict, Optional, Any, Union
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Dict, Optional, Any, Union, Tuple, Iterator
 
 import requests
+from requests.adapters import HTTPAdapter
 from tenacity import retry, stop_after_attempt, wait_random
 
 from dmi_open_data.enums import Parameter, ClimateDataParameter
-from dmi_open_data.utils import distance
+from dmi_open_data.station_index import StationIndex
 
 
 class DMIOpenDataClient:
     _base_url = "https://dmigw.govcloud.dk/{version}/{api}"
+    _default_cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "dmi_open_data")
+    # Seconds cached responses are used for, by the longest matching "{api}/{service}" prefix
+    _default_cache_ttls = {
+        "climateData": 60 * 60,
+        "metObs/collections/station": 24 * 60 * 60,
+        "metObs/collections/observation": 10 * 60,
+    }
 
-    def __init__(self, api_key: str, version: str = "v2"):
+    # Seconds after which climate data is settled, i.e. no longer recalculated
+    _settle_time = 7 * 24 * 60 * 60
+
+    def __init__(
+        self,
+        api_key: str,
+        version: str = "v2",
+        cache_dir: Optional[str] = _default_cache_dir,
+        station_cache_ttl: float = 24 * 60 * 60,
+        pool_size: int = 10,
+        timeout: Union[float, Tuple[float, float]] = (10, 60),
+        cache_responses: bool = False,
+        cache_ttls: Optional[Dict[str, float]] = None,
+        settled_cache_ttl: float = 30 * 24 * 60 * 60,
+        offline: bool = False,
+    ):
+        """
+        Args:
+            api_key (str): DMI API key.
+            version (str, optional): API version. Defaults to "v2".
+            cache_dir (Optional[str], optional): Directory for cached data such as the station list.
+                Defaults to ~/.cache/dmi_open_data. None disables the disk cache.
+            station_cache_ttl (float, optional): Seconds before the cached station list is
+                downloaded again. Defaults to one day.
+            pool_size (int, optional): Number of pooled connections kept open to the API.
+                Defaults to 10.
+            timeout (Union[float, Tuple[float, float]], optional): Request timeout in seconds,
+                or a (connect, read) tuple. Defaults to (10, 60).
+            cache_responses (bool, optional): Cache API responses as gzipped JSON in cache_dir.
+                Defaults to False.
+            cache_ttls (Optional[Dict[str, float]], optional): Seconds cached responses are used for,
+                by "{api}/{service}" prefix, e.g. {"climateData": 3600}. Updates the defaults of
+                one hour for climateData, one day for stations and 10 minutes for observations.
+            settled_cache_ttl (float, optional): Seconds cached climateData responses are used for
+                when the datetime range of the query ended more than a week ago, as DMI no longer
+                recalculates those values. Defaults to 30 days. Queries without a datetime range or
+                with an open-ended, current or future range use `cache_ttls`.
+            offline (bool, optional): Only serve responses from the cache, regardless of their age,
+                and raise LookupError for queries that are not cached. Defaults to False.
+        """
         if api_key is None:
             raise ValueError(f"Invalid value for `api_key`: {api_key}")
         if version == "v1":
@@ -21,15 +76,120 @@ class DMIOpenDataClient:
 
         self.api_key = api_key
         self.version = version
+        self.cache_dir = cache_dir
+        self.station_cache_ttl = station_cache_ttl
+        self._station_index = None
+        self._station_index_time = 0.0
+
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        if (cache_responses or offline) and cache_dir is None:
+            raise ValueError("Caching responses requires a `cache_dir`")
+        self.cache_responses = cache_responses or offline
+        self.cache_ttls = {**self._default_cache_ttls, **(cache_ttls or {})}
+        self.settled_cache_ttl = settled_cache_ttl
+        self.offline = offline
+
+    def close(self):
+        """Close the pooled connections of the client."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def base_url(self, api: str):
         if api not in ("climateData", "metObs"):
             raise NotImplementedError(f"Following api is not supported yet: {api}")
         return self._base_url.format(version=self.version, api=api)
 
-    @retry(stop=stop_after_attempt(10), wait=wait_random(min=0.1, max=1.00))
     def _query(self, api: str, service: str, params: Dict[str, Any], **kwargs):
-        res = requests.get(
+        if not self.cache_responses:
+            return self._request(api=api, service=service, params=params, **kwargs)
+
+        cache_path = self._cache_path(api=api, service=service, params=params)
+        cached = self._read_cache(cache_path, ttl=None if self.offline else self._cache_ttl(api, service, params))
+        if cached is not None:
+            return cached
+        if self.offline:
+            raise LookupError(f"No cached response for {api}/{service} with params {params}")
+
+        data = self._request(api=api, service=service, params=params, **kwargs)
+        self._write_cache(cache_path, data)
+        return data
+
+    def _cache_ttl(self, api: str, service: str, params: Optional[Dict[str, Any]] = None) -> float:
+        if api == "climateData" and self._is_settled((params or {}).get("datetime")):
+            return self.settled_cache_ttl
+
+        endpoint = f"{api}/{service}"
+        prefixes = [prefix for prefix in self.cache_ttls if endpoint.startswith(prefix)]
+        if not prefixes:
+            return 0
+        return self.cache_ttls[max(prefixes, key=len)]
+
+    def _is_settled(self, datetime_argument: Optional[str]) -> bool:
+        """Whether a datetime query argument, as built by `_construct_datetime_argument`, is a range
+        ending more than `_settle_time` seconds ago. Single timestamps, which the query methods build
+        from a `from_time` or `to_time` alone, and open-ended or unparseable ranges are never settled."""
+        if not datetime_argument or "/" not in str(datetime_argument):
+            return False
+
+        end = str(datetime_argument).split("/")[-1]
+        if end in ("", ".."):
+            return False
+        try:
+            end_time = datetime.fromisoformat(end[:-1] if end.endswith("Z") else end)
+        except ValueError:
+            return False
+        if end_time.tzinfo is None:
+            end_time = end_time.replace(tzinfo=timezone.utc)
+
+        return end_time.timestamp() < time.time() - self._settle_time
+
+    def _cache_path(self, api: str, service: str, params: Dict[str, Any]) -> str:
+        """Path of the cached response of a query, keyed by the endpoint and the
+        sorted non-empty params. The api-key is not part of the key."""
+        normalized = {
+            key: str(value)
+            for key, value in params.items()
+            if value is not None and key != "api-key"
+        }
+        key = json.dumps(
+            {"version": self.version, "api": api, "service": service, "params": normalized},
+            sort_keys=True,
+        )
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "responses", digest[:2], f"{digest}.json.gz")
+
+    @staticmethod
+    def _read_cache(cache_path: str, ttl: Optional[float]) -> Optional[Dict[str, Any]]:
+        try:
+            if ttl is not None and time.time() - os.path.getmtime(cache_path) >= ttl:
+                return None
+            with gzip.open(cache_path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_cache(cache_path: str, data: Dict[str, Any]):
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, cache_path)
+
+    @retry(stop=stop_after_attempt(10), wait=wait_random(min=0.1, max=1.00))
+    def _request(self, api: str, service: str, params: Dict[str, Any], **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        res = self.session.get(
             url=f"{self.base_url(api=api)}/{service}",
             params={
                 "api-key": self.api_key,
@@ -44,7 +204,67 @@ class DMIOpenDataClient:
             raise ValueError(
                 f"Failed HTTP request with HTTP status code {http_status_code} and message: {message}"
             )
-        return res.json()
+        return data
+
+    def _iter_pages(
+        self,
+        api: str,
+        service: str,
+        params: Dict[str, Any],
+        page_size: int = 10000,
+        max_workers: int = 4,
+    ) -> Iterator[Dict[str, Any]]:
+        """Iterate over the features of all pages of a query.
+
+        When the first page reports `numberMatched`, the remaining pages are fetched concurrently,
+        with at most `max_workers` pages in flight, and yielded in order. Otherwise pages are
+        fetched one after another until a page is not full. Only the pages in flight are held in memory.
+
+        Args:
+            api (str): API of the query, "metObs" or "climateData".
+            service (str): Service of the query.
+            params (Dict[str, Any]): Query parameters, without limit and offset.
+            page_size (int, optional): Features per page. Defaults to 10000.
+            max_workers (int, optional): Maximum number of pages fetched at a time. Defaults to 4.
+
+        Yields:
+            Dict[str, Any]: Features in the order of the API.
+        """
+
+        def fetch(offset: int) -> List[Dict[str, Any]]:
+            return self._query(
+                api=api,
+                service=service,
+                params={**params, "limit": page_size, "offset": offset},
+            ).get("features", [])
+
+        res = self._query(
+            api=api, service=service, params={**params, "limit": page_size, "offset": 0}
+        )
+        features = res.get("features", [])
+        yield from features
+
+        number_matched = res.get("numberMatched")
+        if not isinstance(number_matched, int) or max_workers < 2:
+            offset = len(features)
+            while len(features) == page_size:
+                features = fetch(offset)
+                yield from features
+                offset += len(features)
+            return
+
+        offsets = iter(range(page_size, number_matched, page_size))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque(
+                executor.submit(fetch, offset)
+                for _, offset in zip(range(max_workers), offsets)
+            )
+            while pending:
+                features = pending.popleft().result()
+                for offset in offsets:
+                    pending.append(executor.submit(fetch, offset))
+                    break
+                yield from features
 
     def get_stations(
         self, limit: Optional[int] = 10000, offset: Optional[int] = 0
@@ -160,6 +380,155 @@ class DMIOpenDataClient:
         )
         return res.get("features", [])
 
+    def iter_stations(
+        self, page_size: int = 10000, max_workers: int = 4
+    ) -> Iterator[Dict[str, Any]]:
+        """Iterate over all DMI stations, fetching pages automatically.
+
+        Args:
+            page_size (int, optional): Stations per page. Defaults to 10000.
+            max_workers (int, optional): Maximum number of pages fetched at a time. Defaults to 4.
+
+        Yields:
+            Dict[str, Any]: DMI stations.
+        """
+        return self._iter_pages(
+            api="metObs",
+            service="collections/station/items",
+            params={},
+            page_size=page_size,
+            max_workers=max_workers,
+        )
+
+    def iter_observations(
+        self,
+        parameter: Optional[Parameter] = None,
+        station_id: Optional[int] = None,
+        from_time: Optional[datetime] = None,
+        to_time: Optional[datetime] = None,
+        page_size: int = 10000,
+        max_workers: int = 4,
+    ) -> Iterator[Dict[str, Any]]:
+        """Iterate over all raw DMI observations matching a query, fetching pages automatically.
+
+        Args:
+            parameter (Optional[Parameter], optional): Returns observations for a specific parameter.
+                Defaults to None.
+            station_id (Optional[int], optional): Search for a specific station using the stationID.
+                Defaults to None.
+            from_time (Optional[datetime], optional): Returns only objects with a "timeObserved" equal
+                to or after a given timestamp. Defaults to None.
+            to_time (Optional[datetime], optional): Returns only objects with a "timeObserved" before
+                (not including) a given timestamp. Defaults to None.
+            page_size (int, optional): Observations per page. Defaults to 10000.
+            max_workers (int, optional): Maximum number of pages fetched at a time. Defaults to 4.
+
+        Yields:
+            Dict[str, Any]: Raw DMI observations.
+        """
+        return self._iter_pages(
+            api="metObs",
+            service="collections/observation/items",
+            params={
+                "parameterId": None if parameter is None else parameter.value,
+                "stationId": station_id,
+                "datetime": _construct_datetime_argument(
+                    from_time=from_time, to_time=to_time
+                ),
+            },
+            page_size=page_size,
+            max_workers=max_workers,
+        )
+
+    def iter_climate_data(
+        self,
+        parameter: Optional[ClimateDataParameter] = None,
+        station_id: Optional[int] = None,
+        from_time: Optional[datetime] = None,
+        to_time: Optional[datetime] = None,
+        time_resolution: Optional[str] = None,
+        page_size: int = 10000,
+        max_workers: int = 4,
+    ) -> Iterator[Dict[str, Any]]:
+        """Iterate over all raw DMI climate data matching a query, fetching pages automatically.
+
+        Args:
+            parameter (Optional[ClimateDataParameter], optional): Returns observations for a specific parameter.
+                Defaults to None.
+            station_id (Optional[int], optional): Search for a specific station using the stationID.
+                Defaults to None.
+            from_time (Optional[datetime], optional): Returns only objects with a "timeObserved" equal
+                to or after a given timestamp. Defaults to None.
+            to_time (Optional[datetime], optional): Returns only objects with a "timeObserved" before
+                (not including) a given timestamp. Defaults to None.
+            time_resolution (Optional[str], optional): Filter by time resolution (hour/day/month/year),
+                ie. what type of time interval the station value represents
+            page_size (int, optional): Values per page. Defaults to 10000.
+            max_workers (int, optional): Maximum number of pages fetched at a time. Defaults to 4.
+
+        Yields:
+            Dict[str, Any]: Raw DMI climate data.
+        """
+        return self._iter_pages(
+            api="climateData",
+            service="collections/stationValue/items",
+            params={
+                "parameterId": None if parameter is None else parameter.value,
+                "stationId": station_id,
+                "datetime": _construct_datetime_argument(
+                    from_time=from_time, to_time=to_time
+                ),
+                "timeResolution": time_resolution,
+            },
+            page_size=page_size,
+            max_workers=max_workers,
+        )
+
+    def iter_grid_values(
+        self,
+        parameter: Optional[Union[ClimateDataParameter, str]] = None,
+        cell_id: Optional[str] = None,
+        from_time: Optional[datetime] = None,
+        to_time: Optional[datetime] = None,
+        time_resolution: Optional[str] = None,
+        grid: str = "10km",
+        page_size: int = 10000,
+        max_workers: int = 4,
+    ) -> Iterator[Dict[str, Any]]:
+        """Iterate over all raw DMI climate grid values matching a query, fetching pages automatically.
+
+        Args:
+            parameter (Optional[Union[ClimateDataParameter, str]], optional): Returns values for a specific
+                parameter, as enum or DMI parameter id. Defaults to None.
+            cell_id (Optional[str], optional): Returns values for a specific grid cell, e.g. "10km_615_66".
+                Defaults to None.
+            from_time (Optional[datetime], optional): Returns only values from or after a given timestamp.
+                Defaults to None.
+            to_time (Optional[datetime], optional): Returns only values before a given timestamp.
+                Defaults to None.
+            time_resolution (Optional[str], optional): Filter by time resolution (hour/day/month/year).
+            grid (str, optional): Grid of the values, "10km" or "20km". Defaults to "10km".
+            page_size (int, optional): Values per page. Defaults to 10000.
+            max_workers (int, optional): Maximum number of pages fetched at a time. Defaults to 4.
+
+        Yields:
+            Dict[str, Any]: Raw DMI climate grid values, in the layout of DMI climate grid files.
+        """
+        return self._iter_pages(
+            api="climateData",
+            service=f"collections/{grid}GridValue/items",
+            params={
+                "parameterId": getattr(parameter, "value", parameter),
+                "cellId": cell_id,
+                "datetime": _construct_datetime_argument(
+                    from_time=from_time, to_time=to_time
+                ),
+                "timeResolution": time_resolution,
+            },
+            page_size=page_size,
+            max_workers=max_workers,
+        )
+
     def list_parameters(self) -> List[Dict[str, Union[str, Parameter]]]:
         """List available observation parameters.
 
@@ -189,9 +558,50 @@ class DMIOpenDataClient:
         """
         return Parameter(parameter_id)
 
+    def get_station_index(self, refresh: bool = False) -> StationIndex:
+        """Get a spatial index over all DMI stations.
+
+        The station list is kept in memory and in a JSON file in the cache directory, and is only
+        downloaded again when it is older than `station_cache_ttl` seconds.
+
+        Args:
+            refresh (bool, optional): Download the station list even if the cache is fresh.
+                Defaults to False.
+
+        Returns:
+            StationIndex: Index over the stations with coordinates.
+        """
+        now = time.time()
+        if not refresh and self._station_index is not None:
+            if now - self._station_index_time < self.station_cache_ttl:
+                return self._station_index
+
+        cache_path = None
+        if self.cache_dir is not None:
+            cache_path = os.path.join(self.cache_dir, f"stations_{self.version}.json")
+
+        if not refresh and cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path, "r") as f:
+                cached = json.load(f)
+            if now - cached.get("time", 0) < self.station_cache_ttl:
+                self._station_index = StationIndex(cached.get("stations", []))
+                self._station_index_time = cached["time"]
+                return self._station_index
+
+        stations = self.get_stations()
+        if cache_path is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(cache_path + ".tmp", "w") as f:
+                json.dump({"time": now, "stations": stations}, f)
+            os.replace(cache_path + ".tmp", cache_path)
+
+        self._station_index = StationIndex(stations)
+        self._station_index_time = now
+        return self._station_index
+
     def get_closest_station(
         self, latitude: float, longitude: float
-    ) -> List[Dict[str, Any]]:
+    ) -> Dict[str, Any]:
         """Get closest weather station from given coordinates.
 
         Args:
@@ -199,29 +609,48 @@ class DMIOpenDataClient:
             longitude (float): Longitude coordinate.
 
         Returns:
-            List[Dict[str, Any]]: Closest weather station.
+            Dict[str, Any]: Closest weather station.
         """
-        stations = self.get_stations()
-        closest_station, closests_dist = None, 1e10
-        for station in stations:
-            coordinates = station.get("geometry", {}).get("coordinates")
-            if coordinates is None or len(coordinates) < 2:
-                continue
-            lat, lon = coordinates[1], coordinates[0]
-            if lat is None or lon is None:
-                continue
-
-            # Calculate distance
-            dist = distance(
-                lat1=latitude,
-                lon1=longitude,
-                lat2=lat,
-                lon2=lon,
-            )
+        closest = self.get_closest_stations(latitude=latitude, longitude=longitude, k=1)
+        return closest[0] if closest else None
+
+    def get_closest_stations(
+        self, latitude: float, longitude: float, k: int = 1
+    ) -> List[Dict[str, Any]]:
+        """Get the k closest weather stations from given coordinates.
 
-            if dist < closests_dist:
-                closests_dist, closest_station = dist, station
-        return closest_station
+        Args:
+            latitude (float): Latitude coordinate.
+            longitude (float): Longitude coordinate.
+            k (int, optional): Number of stations. Defaults to 1.
+
+        Returns:
+            List[Dict[str, Any]]: Weather stations, closest first.
+        """
+        return [
+            station
+            for station, _ in self.get_station_index().query(latitude, longitude, k=k)
+        ]
+
+    def get_stations_within(
+        self, latitude: float, longitude: float, radius_km: float
+    ) -> List[Dict[str, Any]]:
+        """Get weather stations within a radius of given coordinates.
+
+        Args:
+            latitude (float): Latitude coordinate.
+            longitude (float): Longitude coordinate.
+            radius_km (float): Search radius in km.
+
+        Returns:
+            List[Dict[str, Any]]: Weather stations, closest first.
+        """
+        return [
+            station
+            for station, _ in self.get_station_index().query_radius(
+                latitude, longitude, radius_km=radius_km
+            )
+        ]
 
 
 def _construct_datetime_argument(
@@ -0,0 +1,93 @@
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+from dmi_open_data.utils import to_unit_vectors, chord_to_km, km_to_chord
+
+
+class StationIndex:
+    """Spatial index over DMI station coordinates.
+
+    Stations are indexed as vectors on the unit sphere, in a KD-tree when scipy is installed
+    and with a vectorized brute force search otherwise. Stations without coordinates are left out.
+
+    Args:
+        stations (List[Dict[str, Any]]): DMI stations as returned by `DMIOpenDataClient.get_stations`.
+    """
+
+    def __init__(self, stations: List[Dict[str, Any]]):
+        self.stations = []
+        coordinates = []
+        for station in stations:
+            station_coordinates = (station.get("geometry") or {}).get("coordinates")
+            if station_coordinates is None or len(station_coordinates) < 2:
+                continue
+            lon, lat = station_coordinates[0], station_coordinates[1]
+            if lat is None or lon is None:
+                continue
+            self.stations.append(station)
+            coordinates.append((lat, lon))
+
+        coordinates = np.array(coordinates, dtype=float).reshape(-1, 2)
+        self.vectors = to_unit_vectors(coordinates[:, 0], coordinates[:, 1])
+        self.tree = cKDTree(self.vectors) if cKDTree is not None and len(self.stations) else None
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def query(self, latitude: float, longitude: float, k: int = 1) -> List[Tuple[Dict[str, Any], float]]:
+        """Find the k closest stations.
+
+        Args:
+            latitude (float): Latitude coordinate.
+            longitude (float): Longitude coordinate.
+            k (int, optional): Number of stations. Defaults to 1.
+
+        Returns:
+            List[Tuple[Dict[str, Any], float]]: Stations and their distances in km, closest first.
+        """
+        k = min(k, len(self.stations))
+        if k < 1:
+            return []
+
+        vector = to_unit_vectors(latitude, longitude)
+        if self.tree is not None:
+            chords, indices = self.tree.query(vector, k=k)
+            chords, indices = np.atleast_1d(chords), np.atleast_1d(indices)
+        else:
+            all_chords = np.linalg.norm(self.vectors - vector, axis=1)
+            indices = np.argpartition(all_chords, k - 1)[:k]
+            indices = indices[np.argsort(all_chords[indices])]
+            chords = all_chords[indices]
+
+        return [(self.stations[i], float(km)) for i, km in zip(indices, chord_to_km(chords))]
+
+    def query_radius(self, latitude: float, longitude: float, radius_km: float) -> List[Tuple[Dict[str, Any], float]]:
+        """Find all stations within a radius.
+
+        Args:
+            latitude (float): Latitude coordinate.
+            longitude (float): Longitude coordinate.
+            radius_km (float): Search radius in km.
+
+        Returns:
+            List[Tuple[Dict[str, Any], float]]: Stations and their distances in km, closest first.
+        """
+        if not len(self.stations):
+            return []
+
+        vector = to_unit_vectors(latitude, longitude)
+        radius = km_to_chord(radius_km)
+        if self.tree is not None:
+            indices = np.array(self.tree.query_ball_point(vector, r=radius), dtype=int)
+        else:
+            indices = np.flatnonzero(np.linalg.norm(self.vectors - vector, axis=1) <= radius)
+
+        chords = np.linalg.norm(self.vectors[indices] - vector, axis=1)
+        order = np.argsort(chords)
+        return [(self.stations[i], float(km)) for i, km in zip(indices[order], chord_to_km(chords[order]))]
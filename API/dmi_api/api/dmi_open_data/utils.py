@@ -1,5 +1,8 @@
 from datetime import datetime
 from math import cos, asin, sqrt, pi
+from typing import Union
+
+import numpy as np
 
 
 # Constants
@@ -33,3 +36,50 @@ def distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     p = pi / 180.0
     a = 0.5 - cos((lat2 - lat1) * p) / 2.0 + cos(lat1 * p) * cos(lat2 * p) * (1.0 - cos((lon2 - lon1) * p)) / 2
     return CONST_EARTH_DIAMETER * asin(sqrt(a))  # 2*R*asin...
+
+
+def distances(
+    lat: float, lon: float, lats: Union[np.ndarray, list], lons: Union[np.ndarray, list]
+) -> np.ndarray:
+    """Calculate distances in km from one geographical point to many, vectorized with numpy.
+
+    Args:
+        lat (float): Latitude of the point.
+        lon (float): Longitude of the point.
+        lats (Union[np.ndarray, list]): Latitudes of the other points.
+        lons (Union[np.ndarray, list]): Longitudes of the other points.
+
+    Returns:
+        np.ndarray: Haversine distances in km from the point to each of the other points.
+    """
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return CONST_EARTH_DIAMETER * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def to_unit_vectors(lats: Union[np.ndarray, list], lons: Union[np.ndarray, list]) -> np.ndarray:
+    """Convert geographical points to 3D vectors on the unit sphere.
+
+    Euclidean (chord) distances between unit vectors increase with the great circle distance,
+    so spatial indices on the vectors return the same neighbours as haversine distances.
+
+    Args:
+        lats (Union[np.ndarray, list]): Latitudes.
+        lons (Union[np.ndarray, list]): Longitudes.
+
+    Returns:
+        np.ndarray: Array of shape (n, 3).
+    """
+    lats, lons = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+    return np.stack([np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats)], axis=-1)
+
+
+def chord_to_km(chord: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+    """Convert chord lengths on the unit sphere to great circle distances in km."""
+    return CONST_EARTH_DIAMETER * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
+
+
+def km_to_chord(km: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+    """Convert great circle distances in km to chord lengths on the unit sphere."""
+    return 2.0 * np.sin(np.minimum(np.asarray(km) / CONST_EARTH_DIAMETER, pi / 2))
@@ -1,10 +1,21 @@
 import urllib.parse
 import netrc
 import os
-import sys
+import json
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor
+
+from dmi_open_data import DMIOpenDataClient
 
 #STRAIGHT OUTTA CHATGPT!
 
+# DMI day values start at local midnight, e.g. Jan 5 is "from": "2023-01-04T23:00:00+00:00"
+LOCAL_TIMEZONE = ZoneInfo("Europe/Copenhagen")
+# Day files may be compressed afterwards, see tools.dmi_tools.dmi_files.DMIFiles
+DAY_FILE_EXTENSIONS = (".txt", ".txt.gz", ".txt.zst")
+
 def get_api_key(machine):
     """Retrieve API key from .netrc file."""
     secrets = netrc.netrc()
@@ -17,7 +28,7 @@ def get_api_key(machine):
 def build_dmi_url(cell_id, start_datetime, end_datetime, parameter_id, time_resolution, bbox_crs="https://www.opengis.net/def/crs/OGC/1.3/CRS84"):
     """Build the DMI API URL from user inputs."""
     base_url = "https://dmigw.govcloud.dk/v2/climateData/bulk/10kmGridValue/items"
-    
+
     query_params = {
         "cellId": cell_id,
         "datetime": f"{start_datetime}Z/{end_datetime}Z",
@@ -25,23 +36,171 @@ def build_dmi_url(cell_id, start_datetime, end_datetime, parameter_id, time_reso
         "timeResolution": time_resolution,
         "bbox-crs": bbox_crs
     }
-    
+
     api_key = get_api_key("dmigw.govcloud.dk")
     query_params["api-key"] = api_key
-    
+
     url_parts = list(urllib.parse.urlparse(base_url))
     url_parts[4] = urllib.parse.urlencode(query_params)
-    
+
     return urllib.parse.urlunparse(url_parts)
 
-# Example usage:
-cell_id = "10km_615_66"
-start_datetime = "2023-01-01T00:00:00"
-end_datetime = "2024-01-01T00:00:00"
-parameter_id = "pot_evaporation_makkink"
-time_resolution = "day"
 
-url = build_dmi_url(cell_id, start_datetime, end_datetime, parameter_id, time_resolution)
-print(url)
+def to_date(value):
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%Y-%m-%d")
+    if isinstance(value, datetime):
+        value = value.date()
+    return value
+
+
+def missing_periods(output_dir, start_date, end_date, days_per_request=31):
+    """Split the days in the inclusive range start_date - end_date without a YYYY-MM-DD.txt, .txt.gz or .txt.zst
+    file in output_dir into runs of consecutive days of at most days_per_request days.
+
+    Returns:
+        list of list of date: the periods to download.
+    """
+    start_date, end_date = to_date(start_date), to_date(end_date)
+
+    periods = []
+    period = []
+    for i in range((end_date - start_date).days + 1):
+        day = start_date + timedelta(days=i)
+        if any(os.path.exists(os.path.join(output_dir, day.isoformat() + extension)) for extension in DAY_FILE_EXTENSIONS):
+            if period: periods.append(period)
+            period = []
+            continue
+
+        period.append(day)
+        if len(period) == days_per_request:
+            periods.append(period)
+            period = []
+
+    if period: periods.append(period)
+    return periods
+
+
+def local_day(timestamp):
+    """Return the Europe/Copenhagen date of an ISO timestamp as YYYY-MM-DD, None if there is no timestamp."""
+    if not timestamp:
+        return None
+    time = datetime.fromisoformat(str(timestamp))
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=ZoneInfo("UTC"))
+    return time.astimezone(LOCAL_TIMEZONE).date().isoformat()
+
+
+def split_requests(period, parameter_ids, cell_ids=None):
+    """Split a period into one request per parameter and cell, as the API takes one of each per request.
+
+    Returns:
+        list of dict: keyword arguments for DMIOpenDataClient.iter_grid_values
+    """
+    # Padded by a day on both sides, as DMI day values start at local midnight. Values outside the period are dropped
+    from_time = datetime.combine(period[0] - timedelta(days=1), datetime.min.time())
+    to_time = datetime.combine(period[-1] + timedelta(days=2), datetime.min.time())
+
+    return [
+        {"parameter": parameter_id, "cell_id": cell_id, "from_time": from_time, "to_time": to_time}
+        for parameter_id in parameter_ids
+        for cell_id in (cell_ids or [None])
+    ]
+
+
+def download_period(client, output_dir, period, parameter_ids, cell_ids=None, time_resolution="day", grid="10km", max_workers=8):
+    """Download all values of a period into one YYYY-MM-DD.txt file per local day, the Danish day a value starts on.
+
+    Requests run concurrently and write each page to per-day .part files as it arrives, so whole responses are
+    never held in memory. When all requests are done, the .part files of days with values are renamed to .txt.
+    Days without values, such as days DMI has not published yet, get no file and are requested again on the next run.
+
+    Returns:
+        int: number of features written.
+    """
+    days = {day.isoformat() for day in period}
+    part_paths = {day: os.path.join(output_dir, f"{day}.txt.part") for day in days}
+    part_files = {day: open(part_path, "w") for day, part_path in part_paths.items()}
+    day_counts = {day: 0 for day in days}
+    lock = threading.Lock()
+    flush_size = 10000
+
+    def download(request):
+        written = 0
+        buffered = 0
+        lines = {}
+        for feature in client.iter_grid_values(time_resolution=time_resolution, grid=grid, max_workers=1, **request):
+            day = local_day(feature.get("properties", {}).get("from"))
+            if day not in days: continue
+            lines.setdefault(day, []).append(json.dumps(feature, separators=(",", ":")) + "\n")
+
+            buffered += 1
+            if buffered >= flush_size:
+                written += flush(lines)
+                buffered = 0
+
+        return written + flush(lines)
+
+    def flush(lines):
+        written = 0
+        with lock:
+            for day, day_lines in lines.items():
+                part_files[day].writelines(day_lines)
+                day_counts[day] += len(day_lines)
+                written += len(day_lines)
+        lines.clear()
+        return written
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            written = sum(executor.map(download, split_requests(period, parameter_ids, cell_ids)))
+    finally:
+        for part_file in part_files.values():
+            part_file.close()
+
+    for day, part_path in part_paths.items():
+        if day_counts[day]:
+            os.replace(part_path, os.path.join(output_dir, f"{day}.txt"))
+        else:
+            os.remove(part_path)
+
+    return written
+
+
+def download_grid_values(output_dir, start_date, end_date, parameter_ids, cell_ids=None, api_key=None, time_resolution="day", grid="10km", days_per_request=31, max_workers=8):
+    """Download DMI climate grid values into YYYY-MM-DD.txt day files, the layout DMITools.file_from_datetime expects.
+
+    The date range is split into periods of days_per_request days, and each period into one request per parameter
+    and cell. The requests of a period are fetched concurrently through one pooled client. Days that already have a
+    file in output_dir are skipped, so an interrupted download can be restarted with the same arguments.
+
+    Parameters:
+        output_dir (str path): directory for the day files
+        start_date, end_date (str or date): first and last day, YYYY-MM-DD strings or date objects
+        parameter_ids (list of str): DMI parameterIds. Example: ["pot_evaporation_makkink"]
+        cell_ids (list of str, optional): cellIds. Defaults to all cells of the grid
+        api_key (str, optional): DMI climateData API key. Defaults to the key for dmigw.govcloud.dk in .netrc
+        time_resolution (str, optional): time resolution of the values. Defaults to "day"
+        grid (str, optional): "10km" or "20km". Defaults to "10km"
+        days_per_request (int, optional): days per request. Defaults to 31
+        max_workers (int, optional): number of requests fetched at a time. Defaults to 8
+    """
+    if isinstance(parameter_ids, str): parameter_ids = [parameter_ids]
+    if isinstance(cell_ids, str): cell_ids = [cell_ids]
+
+    os.makedirs(output_dir, exist_ok=True)
+    api_key = api_key or get_api_key("dmigw.govcloud.dk")
+
+    periods = missing_periods(output_dir, start_date, end_date, days_per_request)
+    with DMIOpenDataClient(api_key=api_key, pool_size=max_workers) as client:
+        for i, period in enumerate(periods):
+            written = download_period(client, output_dir, period, parameter_ids, cell_ids, time_resolution, grid, max_workers)
+            print(f'Period {i + 1} / {len(periods)}: {period[0]} - {period[-1]}, {written} values')
+
+
+if __name__ == "__main__":
+    output_dir = "J:/javej/drought/drought_et/dmi_climate_grid/raw_files/"
+    cell_ids = ['10km_615_66', '10km_621_51', '10km_619_46', '10km_621_52']
+    parameter_ids = ["pot_evaporation_makkink"]
 
-print('AAAA')
+    download_grid_values(output_dir, "2023-01-01", "2023-12-31", parameter_ids, cell_ids)
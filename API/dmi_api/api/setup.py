@@ -24,6 +24,7 @@ setuptools.setup(
     url="https://github.com/LasseRegin/dmi-open-data",
     packages=setuptools.find_packages(),
     install_requires=packages,
+    extras_require={"async": ["aiohttp>=3.8"]},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
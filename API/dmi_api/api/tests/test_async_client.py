@@ -0,0 +1,114 @@
+import asyncio
+import random
+import unittest
+
+from dmi_open_data import AsyncDMIOpenDataClient
+
+
+class FakeAsyncClient(AsyncDMIOpenDataClient):
+    """Answers queries from memory, so the tests do not need aiohttp or network access."""
+
+    def __init__(self, total=0, number_matched=True, fail_offsets=()):
+        self.api_key = "test"
+        self.version = "v2"
+        self.total = total
+        self.number_matched = number_matched
+        self.fail_offsets = set(fail_offsets)
+        self.queries = []
+
+    async def _query(self, api, service, params, **kwargs):
+        self.queries.append((service, params))
+        # Finish in random order, so ordering does not rely on the order of completion
+        await asyncio.sleep(random.random() / 100)
+
+        offset, limit = params["offset"], params["limit"]
+        if offset in self.fail_offsets:
+            raise ValueError(f"Failed HTTP request at offset {offset}")
+
+        res = {"features": list(range(offset, min(offset + limit, self.total)))}
+        if self.number_matched:
+            res["numberMatched"] = self.total
+        return res
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+class TestAsyncGridValues(unittest.TestCase):
+    def test_concurrent_pages_in_order(self):
+        client = FakeAsyncClient(total=95)
+        features = asyncio.run(collect(client.iter_grid_values(cell_id="10km_615_66", page_size=10, max_workers=3)))
+        self.assertEqual(features, list(range(95)))
+
+    def test_sequential_pages_without_number_matched(self):
+        client = FakeAsyncClient(total=100, number_matched=False)
+        features = asyncio.run(collect(client.iter_grid_values(page_size=10)))
+        self.assertEqual(features, list(range(100)))
+
+    def test_grid_query_parameters(self):
+        client = FakeAsyncClient(total=5)
+        asyncio.run(client.get_grid_values("pot_evaporation_makkink", cell_id="20km_615_66", grid="20km"))
+
+        service, params = client.queries[0]
+        self.assertEqual(service, "collections/20kmGridValue/items")
+        self.assertEqual(params["parameterId"], "pot_evaporation_makkink")
+        self.assertEqual(params["cellId"], "20km_615_66")
+
+    def test_failed_page_is_raised(self):
+        client = FakeAsyncClient(total=95, fail_offsets=[50])
+        with self.assertRaises(ValueError):
+            asyncio.run(collect(client.iter_grid_values(page_size=10, max_workers=3)))
+
+
+class TestAsyncIterators(unittest.TestCase):
+    def test_stations(self):
+        client = FakeAsyncClient(total=45)
+        stations = asyncio.run(collect(client.iter_stations(page_size=10, max_workers=4)))
+
+        self.assertEqual(stations, list(range(45)))
+        self.assertEqual({service for service, _ in client.queries}, {"collections/station/items"})
+
+    def test_observations(self):
+        client = FakeAsyncClient(total=30, number_matched=False)
+        observations = asyncio.run(collect(client.iter_observations(station_id="06184", page_size=10)))
+
+        self.assertEqual(observations, list(range(30)))
+        self.assertTrue(all(params["stationId"] == "06184" for _, params in client.queries))
+
+    def test_climate_data(self):
+        client = FakeAsyncClient(total=95)
+        values = asyncio.run(collect(client.iter_climate_data(station_id="06184", time_resolution="day", page_size=10)))
+
+        self.assertEqual(values, list(range(95)))
+        self.assertEqual({service for service, _ in client.queries}, {"collections/stationValue/items"})
+        self.assertTrue(all(params["timeResolution"] == "day" for _, params in client.queries))
+
+
+class TestGather(unittest.TestCase):
+    def test_results_in_query_order(self):
+        client = FakeAsyncClient(total=100)
+        queries = [{"offset": offset, "limit": 5} for offset in range(0, 100, 10)]
+
+        results = asyncio.run(client.gather("get_grid_values", queries))
+
+        self.assertEqual(results, [list(range(offset, offset + 5)) for offset in range(0, 100, 10)])
+
+    def test_iterating_methods_are_collected(self):
+        client = FakeAsyncClient(total=25)
+        queries = [{"cell_id": "10km_615_66", "page_size": 10}, {"cell_id": "10km_621_51", "page_size": 10}]
+
+        results = asyncio.run(client.gather("iter_grid_values", queries))
+
+        self.assertEqual(results, [list(range(25)), list(range(25))])
+
+    def test_error_is_raised(self):
+        client = FakeAsyncClient(total=100, fail_offsets=[30])
+        queries = [{"offset": offset, "limit": 5} for offset in range(0, 100, 10)]
+
+        with self.assertRaises(ValueError):
+            asyncio.run(client.gather("get_grid_values", queries))
+
+
+if __name__ == "__main__":
+    unittest.main()
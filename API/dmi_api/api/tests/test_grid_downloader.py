@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from dmi_url_parser import download_period, local_day, missing_periods
+
+
+class FakeGridClient:
+    def __init__(self, features):
+        self.features = features
+
+    def iter_grid_values(self, **kwargs):
+        return iter(self.features)
+
+
+def day_feature(time_from, time_to, value):
+    return {
+        "properties": {
+            "cellId": "10km_615_66",
+            "from": time_from,
+            "parameterId": "pot_evaporation_makkink",
+            "timeResolution": "day",
+            "to": time_to,
+            "value": value,
+        },
+        "type": "Feature",
+    }
+
+
+class TestGridDownloader(unittest.TestCase):
+    def test_local_day(self):
+        self.assertEqual(local_day("2023-01-04T23:00:00+00:00"), "2023-01-05")
+        self.assertEqual(local_day("2023-07-04T22:00:00+00:00"), "2023-07-05")
+        self.assertEqual(local_day("2023-07-04T12:00:00+00:00"), "2023-07-04")
+
+    def test_values_are_written_to_their_local_day(self):
+        client = FakeGridClient([
+            day_feature("2023-01-03T23:00:00+00:00", "2023-01-04T23:00:00+00:00", 1.0),
+            day_feature("2023-01-04T23:00:00+00:00", "2023-01-05T23:00:00+00:00", 2.0),
+            day_feature("2023-01-05T23:00:00+00:00", "2023-01-06T23:00:00+00:00", 3.0),
+        ])
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            written = download_period(client, output_dir, [date(2023, 1, 5)], ["pot_evaporation_makkink"], max_workers=1)
+
+            self.assertEqual(written, 1)
+            self.assertEqual(sorted(os.listdir(output_dir)), ["2023-01-05.txt"])
+            with open(os.path.join(output_dir, "2023-01-05.txt")) as file:
+                values = [json.loads(line)["properties"]["value"] for line in file]
+            self.assertEqual(values, [2.0])
+
+    def test_days_without_values_get_no_file(self):
+        client = FakeGridClient([
+            day_feature("2023-01-04T23:00:00+00:00", "2023-01-05T23:00:00+00:00", 2.0),
+        ])
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            written = download_period(client, output_dir, [date(2023, 1, 5), date(2023, 1, 6)], ["pot_evaporation_makkink"], max_workers=1)
+
+            self.assertEqual(written, 1)
+            self.assertEqual(sorted(os.listdir(output_dir)), ["2023-01-05.txt"])
+            self.assertEqual(missing_periods(output_dir, date(2023, 1, 5), date(2023, 1, 6)), [[date(2023, 1, 6)]])
+
+    def test_compressed_days_are_not_missing(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            for name in ("2023-01-01.txt", "2023-01-02.txt.gz", "2023-01-03.txt.zst"):
+                open(os.path.join(output_dir, name), "w").close()
+
+            self.assertEqual(missing_periods(output_dir, date(2023, 1, 1), date(2023, 1, 4)), [[date(2023, 1, 4)]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from dmi_open_data import DMIOpenDataClient
+
+
+class FakePagesClient(DMIOpenDataClient):
+    def __init__(self, total, number_matched=True):
+        super().__init__(api_key="test", cache_dir=None)
+        self.total = total
+        self.number_matched = number_matched
+
+    def _query(self, api, service, params, **kwargs):
+        offset, limit = params["offset"], params["limit"]
+        res = {"features": list(range(offset, min(offset + limit, self.total)))}
+        if self.number_matched:
+            res["numberMatched"] = self.total
+        return res
+
+
+class TestPagination(unittest.TestCase):
+    def test_concurrent_pages_in_order(self):
+        client = FakePagesClient(total=95)
+        features = list(client.iter_observations(page_size=10, max_workers=3))
+        self.assertEqual(features, list(range(95)))
+
+    def test_sequential_pages_without_number_matched(self):
+        client = FakePagesClient(total=100, number_matched=False)
+        features = list(client.iter_climate_data(page_size=10))
+        self.assertEqual(features, list(range(100)))
+
+    def test_empty_result(self):
+        client = FakePagesClient(total=0)
+        self.assertEqual(list(client.iter_stations(page_size=10)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
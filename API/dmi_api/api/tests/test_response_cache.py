@@ -0,0 +1,114 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from dmi_open_data import DMIOpenDataClient
+from dmi_open_data.client import _construct_datetime_argument
+
+
+class FakeRequestClient(DMIOpenDataClient):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = []
+
+    def _request(self, api, service, params, **kwargs):
+        self.requests.append((api, service, params))
+        return {"features": [{"properties": {"request": len(self.requests)}}]}
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def client(self, **kwargs):
+        return FakeRequestClient(cache_dir=self.cache_dir, cache_responses=True, **kwargs)
+
+    def test_cached_response_is_reused(self):
+        client = self.client(api_key="first")
+        query = dict(station_id="06184", from_time=datetime(2021, 7, 20), to_time=datetime(2021, 7, 24))
+        first = client.get_climate_data(**query)
+
+        # The api-key is not part of the cache key
+        other_client = self.client(api_key="second")
+        self.assertEqual(other_client.get_climate_data(**query), first)
+        self.assertEqual(len(other_client.requests), 0)
+
+        other_client.get_climate_data(station_id="06180")
+        self.assertEqual(len(other_client.requests), 1)
+
+    def test_expired_response_is_refetched(self):
+        client = self.client(api_key="key", cache_ttls={"metObs/collections/observation": 60})
+        client.get_observations(station_id="06184")
+
+        cache_path = client._cache_path(
+            api="metObs",
+            service="collections/observation/items",
+            params={"stationId": "06184", "limit": 10000, "offset": 0},
+        )
+        past = time.time() - 120
+        os.utime(cache_path, (past, past))
+
+        client.get_observations(station_id="06184")
+        self.assertEqual(len(client.requests), 2)
+
+    def age_cache(self, client, api, service, params, seconds):
+        cache_path = client._cache_path(api=api, service=service, params=params)
+        past = time.time() - seconds
+        os.utime(cache_path, (past, past))
+
+    def test_settled_climate_data_is_kept(self):
+        client = self.client(api_key="key")
+        query = dict(station_id="06184", from_time=datetime(2021, 7, 20), to_time=datetime(2021, 7, 24))
+        client.get_climate_data(**query)
+
+        params = {
+            "stationId": "06184",
+            "datetime": "2021-07-20T00:00:00Z/2021-07-24T00:00:00Z",
+            "limit": 10000,
+            "offset": 0,
+        }
+        self.age_cache(client, "climateData", "collections/stationValue/items", params, 2 * 24 * 60 * 60)
+
+        client.get_climate_data(**query)
+        self.assertEqual(len(client.requests), 1)
+
+    def test_open_and_current_climate_data_is_refetched(self):
+        client = self.client(api_key="key")
+        recent = datetime.utcnow().replace(microsecond=0) - timedelta(days=2)
+        queries = [
+            dict(station_id="06184", from_time=datetime(2021, 7, 20)),
+            dict(station_id="06184", from_time=datetime(2021, 7, 20), to_time=recent),
+        ]
+
+        for query in queries:
+            client.get_climate_data(**query)
+            params = {
+                "stationId": "06184",
+                "datetime": _construct_datetime_argument(query["from_time"], query.get("to_time")),
+                "limit": 10000,
+                "offset": 0,
+            }
+            self.age_cache(client, "climateData", "collections/stationValue/items", params, 2 * 60 * 60)
+
+            client.get_climate_data(**query)
+
+        self.assertEqual(len(client.requests), 4)
+
+    def test_offline(self):
+        self.client(api_key="key").get_stations()
+
+        offline_client = FakeRequestClient(api_key="key", cache_dir=self.cache_dir, offline=True)
+        self.assertEqual(len(offline_client.get_stations()), 1)
+        with self.assertRaises(LookupError):
+            offline_client.get_stations(limit=10)
+        self.assertEqual(len(offline_client.requests), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from dmi_open_data import StationIndex, distances
+from dmi_open_data.utils import distance
+
+
+def _station(station_id, lat, lon):
+    return {
+        "geometry": {"coordinates": [lon, lat], "type": "Point"},
+        "properties": {"stationId": station_id},
+    }
+
+
+class TestStationIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stations = [
+            _station("06180", 55.6136, 12.6456),
+            _station("06156", 55.7157, 11.6089),
+            _station("06060", 56.2935, 9.1138),
+            _station("06019", 56.9958, 8.5575),
+            {"geometry": None, "properties": {"stationId": "missing"}},
+        ]
+        cls.index = StationIndex(cls.stations)
+
+    def test_distances(self):
+        lats, lons = [55.6136, 56.9958], [12.6456, 8.5575]
+        expected = [distance(55.7, 12.56, lat, lon) for lat, lon in zip(lats, lons)]
+        np.testing.assert_allclose(distances(55.7, 12.56, lats, lons), expected)
+
+    def test_skips_stations_without_coordinates(self):
+        self.assertEqual(len(self.index), 4)
+
+    def test_query(self):
+        closest = self.index.query(55.7, 12.56, k=2)
+        self.assertEqual(
+            [station["properties"]["stationId"] for station, _ in closest],
+            ["06180", "06156"],
+        )
+        self.assertAlmostEqual(
+            closest[0][1], distance(55.7, 12.56, 55.6136, 12.6456), places=6
+        )
+
+    def test_query_radius(self):
+        within = self.index.query_radius(56.1, 9.2, radius_km=120)
+        self.assertEqual(
+            [station["properties"]["stationId"] for station, _ in within],
+            ["06060", "06019"],
+        )
+        self.assertTrue(all(km <= 120 for _, km in within))
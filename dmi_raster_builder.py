@@ -8,8 +8,14 @@ from shapely.ops import unary_union
 import os
 import glob
 import sys
+from datetime import datetime, timedelta
+from rasterio.windows import Window
+from pyproj import Transformer
 
 from tools.dmi_tools.dmi_tools import DMITools
+from tools.dmi_tools.dmi_grid import DMIGrid
+from tools.dmi_tools.dmi_files import DMIFiles
+from tools.dmi_tools.dmi_records import DMIRecords
 
 import rasterio
 from rasterio import features
@@ -84,40 +90,196 @@ def bboxes_to_raster(bbox_value_list, pixel_size=0.0001, nodata_value=0, output_
     else:
         return raster_data, transform
 
-if __name__ == '__main__':
 
-    dmi_data_dir = "J:/javej/drought/drought_et/dmi_climate_grid/sorted_et_files/"
-    # dmi_raster_dir = "J:/javej//drought/drought_et/dmi_PET_raster/"
-    dmi_param = "pot_evaporation_makkink"
-    dmi_raster_output = 'dmi_rasters/pet/'
+def cells_to_raster(cell_value_list, upsample=1, nodata_value=0, bounds=None, output_file=None):
+    """
+    Converts a list of DMI grid cellIds and associated values into a raster with EPSG:25832.
+    The cells are placed on the grid straight from their cellIds, so no geometry work is done.
+
+    Parameters:
+    - cell_value_list: List of tuples [(cellId, value), ...]. Example: [('10km_615_66', 1.4), ...]
+    - upsample: Integer factor to upsample the native grid resolution by (default: 1)
+    - nodata_value: Value for pixels not covered by any cell (default: 0)
+    - bounds: Optional. (minx, miny, maxx, maxy) in EPSG:25832 aligned to the grid, e.g. DMIGrid.national_bounds.
+      Defaults to the extent of the cells
+    - output_file: Optional. If provided, the raster will be saved to this file.
+
+    Returns:
+    - raster_data: Numpy array of the rasterized data (if output_file is None)
+    - transform: Affine transform for the raster data
+    """
+
+    cell_ids = [cell_id for cell_id, _ in cell_value_list]
+    values = [value for _, value in cell_value_list]
+
+    raster_data, transform = DMIGrid.cells_to_array(
+        cell_ids,
+        values,
+        upsample=upsample,
+        nodata=nodata_value,
+        bounds=bounds
+    )
+
+    if output_file is not None:
+        height, width = raster_data.shape
+        with rasterio.open(
+            output_file,
+            'w',
+            driver='GTiff',
+            height=height,
+            width=width,
+            count=1,
+            dtype=raster_data.dtype,
+            crs=CRS.from_epsg(25832),
+            transform=transform,
+            nodata=nodata_value
+        ) as dst:
+            dst.write(raster_data, 1)
+    else:
+        return raster_data, transform
 
-    localized_output = "test_files/localized/"
-    crs = 'EPSG_4329'
+def build_annual_cube(dmi_data_dir, param, year, output_file, upsample=1, nodata_value=-9999, bounds=DMIGrid.national_bounds):
+    """
+    Builds a multi-band GeoTIFF with one band per day of a year for a DMI climate grid parameter,
+    on a fixed national grid in EPSG:25832.
+    Each band is described by its date (YYYY-MM-DD) and the dates are also stored in the 'dates' tag.
+    Days without a day file are nodata.
 
+    The cube is tiled, so a site's time series or one day's field is a single windowed read,
+    see read_cube_series and read_cube_day.
 
-    #THIS HERE IS EVIDENCE FOR THE CORE OF ALL MY PROBLEMS!!!!!
-    print(os.environ.get('PROJ_DATA'))
-    # print(os.environ.get())
-    sys.exit()
+    Parameters:
+    - dmi_data_dir: Directory with DMI climate grid day files, YYYY-MM-DD.txt(.gz/.zst)
+    - param: DMI climate grid parameter. Example: 'pot_evaporation_makkink'
+    - year: Year of the cube
+    - output_file: Path of the output GeoTIFF
+    - upsample: Integer factor to upsample the native grid resolution by (default: 1)
+    - nodata_value: Value for days and pixels without data (default: -9999)
+    - bounds: (minx, miny, maxx, maxy) in EPSG:25832 aligned to the grid (default: DMIGrid.national_bounds)
 
-    for dmi_file in glob.glob(dmi_data_dir + '*.txt'):
+    Returns:
+    - dates: list of the band dates as YYYY-MM-DD strings
+    """
 
-        dmi_jsons = DMITools.get_all_data(dmi_file, dmi_param)
-        dmi_data = DMITools.convert_jsons_to_bbox_val(dmi_jsons)
+    first_day = datetime(year, 1, 1)
+    dates = [(first_day + timedelta(days=i)).strftime('%Y-%m-%d') for i in range((datetime(year + 1, 1, 1) - first_day).days)]
+
+    dst = None
+    try:
+        for band, date in enumerate(dates, start=1):
+            dmi_file = DMIFiles.find_file(dmi_data_dir, date)
+            records = list(DMIRecords.iter_records(dmi_file, params=[param])) if os.path.exists(dmi_file) else []
+
+            if dst is None and records:
+                grid, transform = DMIGrid.cells_to_array(
+                    [record.cell_id for record in records],
+                    [record.value for record in records],
+                    upsample=upsample,
+                    nodata=nodata_value,
+                    bounds=bounds
+                )
+                height, width = grid.shape
+
+                dst = rasterio.open(
+                    output_file,
+                    'w',
+                    driver='GTiff',
+                    height=height,
+                    width=width,
+                    count=len(dates),
+                    dtype='float32',
+                    crs=CRS.from_epsg(25832),
+                    transform=transform,
+                    nodata=nodata_value,
+                    tiled=True,
+                    blockxsize=256,
+                    blockysize=256,
+                    compress='deflate'
+                )
+                for empty_band in range(1, band):
+                    dst.write(np.full((height, width), nodata_value, dtype='float32'), empty_band)
+
+            if dst is None:
+                continue
+
+            if records:
+                grid, _ = DMIGrid.cells_to_array(
+                    [record.cell_id for record in records],
+                    [record.value for record in records],
+                    upsample=upsample,
+                    nodata=nodata_value,
+                    bounds=bounds
+                )
+            else:
+                grid = np.full((height, width), nodata_value, dtype='float32')
+
+            dst.write(grid, band)
+
+        if dst is None:
+            raise ValueError(f'No {param} data for {year} in {dmi_data_dir}')
+
+        dst.update_tags(dates=','.join(dates), parameterId=param)
+        for band, date in enumerate(dates, start=1):
+            dst.set_band_description(band, date)
+    finally:
+        if dst is not None:
+            dst.close()
+
+    return dates
+
+
+def read_cube_series(cube_file, location, crs='EPSG:4326'):
+    """
+    Reads the time series of a location from an annual cube in one windowed read.
 
-        dmi_raster_output = os.path.join(dmi_raster_output, os.path.basename(dmi_file))
-        bboxes_to_raster(dmi_data, output_file = dmi_raster_output)
+    Parameters:
+    - cube_file: Path to a cube from build_annual_cube
+    - location: (x, y) coordinates, e.g. (lon, lat)
+    - crs: CRS of the location (default: EPSG:4326)
 
-        # bboxes_to_raster(bbox_value_list, pixel_size=0.0001, nodata_value=0, output_file=None)
+    Returns:
+    - dates: list of YYYY-MM-DD strings
+    - values: numpy array with one value per date, NaN where there is no data
+    """
+    with rasterio.open(cube_file) as src:
+        x, y = Transformer.from_crs(crs, src.crs, always_xy=True).transform(*location)
+        row, col = src.index(x, y)
+        if not (0 <= row < src.height and 0 <= col < src.width):
+            raise ValueError(f'{location} is outside {cube_file}')
+
+        values = src.read(window=Window(col, row, 1, 1))[:, 0, 0].astype('float64')
+        values[values == src.nodata] = np.nan
+        return list(src.descriptions), values
 
-        #TODO the .proj thing is giving me a headache. Fix the path
 
-        sys.exit()
+def read_cube_day(cube_file, date, window=None):
+    """
+    Reads the field of one day from an annual cube.
+
+    Parameters:
+    - cube_file: Path to a cube from build_annual_cube
+    - date: YYYY-MM-DD string or datetime object
+    - window: Optional rasterio Window to read
 
+    Returns:
+    - numpy array of the day's field
+    """
+    if isinstance(date, datetime):
+        date = date.strftime('%Y-%m-%d')
 
+    with rasterio.open(cube_file) as src:
+        return src.read(src.descriptions.index(date) + 1, window=window)
 
 
+if __name__ == '__main__':
 
+    dmi_data_dir = "J:/javej/drought/drought_et/dmi_climate_grid/sorted_et_files/"
+    dmi_param = "pot_evaporation_makkink"
+    dmi_raster_output = 'dmi_rasters/pet/'
+    years = [2023]
 
-    
+    os.makedirs(dmi_raster_output, exist_ok=True)
 
+    for year in years:
+        output_file = os.path.join(dmi_raster_output, f'{dmi_param}_{year}.tif')
+        build_annual_cube(dmi_data_dir, dmi_param, year, output_file)
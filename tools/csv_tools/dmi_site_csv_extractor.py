@@ -0,0 +1,157 @@
+import os
+import csv
+from datetime import datetime, timedelta
+import numpy as np
+from shapely.geometry import Point, Polygon
+from shapely import STRtree
+
+from tools.dmi_tools.dmi_data_extractor import climate_data_searcher
+from tools.dmi_tools.dmi_records import DMIRecords
+from tools.dmi_tools.dmi_store import DMIStore
+
+
+def find_site_cells(sites, dmi_file, param = None):
+    """
+    Maps site coordinates to the DMI grid cells containing them with a point-in-polygon lookup
+    on the cells of one DMI day file. The cells are the same in every day file, so this is done once.
+
+    Parameters:
+    - sites (list): list of ([lat, lon], location name) tuples
+    - dmi_file (str): path to a DMI climate grid file
+    - param (str, optional): only use cells of this parameterId
+
+    Returns:
+    - dict: location name -> cellId, sites outside the grid are left out
+    """
+    cells = {}
+    for record in DMIRecords.iter_records(dmi_file, params = [param] if param else None):
+        cells.setdefault(record.cell_id, record.bbox)
+
+    cell_ids = list(cells)
+    tree = STRtree([Polygon(bbox[0]) for bbox in cells.values()])
+
+    site_cells = {}
+    for (lat, lon), location_name in sites:
+        matches = tree.query(Point(lon, lat), predicate = 'intersects')
+        if not len(matches):
+            print(f'{location_name} at {lat}, {lon} is outside the DMI grid')
+            continue
+        site_cells[location_name] = cell_ids[min(matches)]
+
+    return site_cells
+
+
+def extract_site_series(source, site_cells, param, start = None, end = None):
+    """
+    Extracts the daily values of a parameter for the cells of the sites.
+    Day files are read once each, filtered to the site cells while reading, and a store only opens
+    the partitions of the parameter and years asked for. Sites in the same cell get the same series.
+
+    Parameters:
+    - source (str path or DMIStore): directory with DMI climate grid files, or a DMIStore
+    - site_cells (dict): location name -> cellId, see find_site_cells
+    - param (str): parameterId. Example: "pot_evaporation_makkink"
+    - start, end (str or datetime, optional): inclusive date range. Defaults to all dates in source
+
+    Returns:
+    - dates (list of datetime.date): every date in the range
+    - values (numpy array): float array of shape (dates, sites) in the order of site_cells, NaN where there is no value
+    """
+    cells = list(site_cells.values())
+
+    if not isinstance(source, DMIStore):
+        searcher = climate_data_searcher(source, filter_dates = (start, end) if start and end else False)
+        if not searcher.climate_file_lookup:
+            return [], np.empty((0, len(cells)))
+
+        start = start or min(searcher.climate_file_lookup)
+        end = end or max(searcher.climate_file_lookup)
+        dates, values = searcher.get_series([param], cells, start, end)
+        return dates, values[:, :, 0]
+
+    def to_date(date):
+        if isinstance(date, str):
+            date = datetime.strptime(date, "%Y-%m-%d")
+        if isinstance(date, datetime):
+            date = date.date()
+        return date
+
+    keys = {'parameterId': param, 'cellId': cells}
+    if start and end:
+        keys['year'] = list(range(to_date(start).year, to_date(end).year + 1))
+
+    columns = source.read(**keys)
+    if not len(columns['date']):
+        return [], np.empty((0, len(cells)))
+
+    start = to_date(start) if start else columns['date'].min().astype(datetime)
+    end = to_date(end) if end else columns['date'].max().astype(datetime)
+    dates = [start + timedelta(days = i) for i in range((end - start).days + 1)]
+
+    day_index = (columns['date'] - np.datetime64(start, 'D')).astype(int)
+    in_range = (day_index >= 0) & (day_index < len(dates))
+
+    values = np.full((len(dates), len(cells)), np.nan)
+    for i, cell in enumerate(cells):
+        selection = in_range & (columns['cell_id'] == cell)
+        values[day_index[selection], i] = columns['value'][selection]
+
+    return dates, values
+
+
+def save_site_csv(dates, values, output_csv, data_tag = 'average_value'):
+    """
+    Saves a site time series to a CSV file in the id,date,<data_tag> layout of the aux CSVs,
+    with YYYYMMDD dates. Dates without a value are left out.
+
+    Parameters:
+    - dates (list of datetime.date): dates of the values
+    - values (numpy array): values of one site
+    - output_csv (str): Path to the output CSV file.
+    - data_tag (str, optional): label of the value column. Defaults to 'average_value'
+    """
+    with open(output_csv, mode='w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['id', 'date', data_tag])
+
+        rows = [(date, value) for date, value in zip(dates, values) if not np.isnan(value)]
+        for i, (date, value) in enumerate(rows):
+            writer.writerow([i, date.strftime('%Y%m%d'), float(value)])
+
+
+if __name__ == "__main__":
+
+    """
+    This script takes DMI climate grid day files and produces standardized AUX csvs
+    for plotting, without rasterizing the DMI data first
+
+    Important! auxdata_type, product and location may not contain underscores!
+    """
+
+    dmi_data_dir = "J:/javej/drought/drought_et/dmi_climate_grid/sorted_et_files/"
+
+    auxdata_type = 'dmi-pet'
+    param = 'pot_evaporation_makkink'
+    product = 'pot-evaporation-makkink'
+    data_tag = 'PET_ET'
+
+    output_dir = 'test_dir/et_data/'
+
+    #lat, lon and location name
+    et_sample_points = [
+        ([55.484757, 11.642088], 'soroe'),
+        ([56.038813, 9.160688], 'voulund'),
+        ([55.913856, 8.401428], 'skjern'),
+        ([56.075209, 9.333798], 'gludsted')
+    ]
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    searcher = climate_data_searcher(dmi_data_dir)
+    site_cells = find_site_cells(et_sample_points, searcher.climate_files[0][1], param)
+
+    dates, values = extract_site_series(dmi_data_dir, site_cells, param, '2023-01-01', '2023-12-31')
+
+    for i, location_name in enumerate(site_cells):
+        csv_name = f'{auxdata_type}_{product}_{location_name}.csv'
+        save_site_csv(dates, values[:, i], os.path.join(output_dir, csv_name), data_tag = data_tag)
@@ -0,0 +1,214 @@
+import os
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import numpy as np
+
+from tools.dmi_tools.dmi_files import DMIFiles
+from tools.dmi_tools.dmi_records import DMIRecord, DMIRecords
+
+
+class DMIAggregator:
+    """
+    Aggregates hourly DMI climate grid records into daily records.
+
+    Records are grouped by parameterId, cellId and local day, with the group-by done on
+    integer coded columns with numpy. The daily records keep the parameterId and the layout
+    of the DMI climate grid files, with timeResolution 'day' and from/to at local midnight,
+    so they can be used by DMITools like DMIs own daily values.
+
+    Parameters:
+     - aggregations (dict, optional): parameterId -> 'sum', 'mean', 'min' or 'max'.
+       Example: {'mean_radiation': 'mean', 'acc_precip': 'sum'}
+     - default (str, optional): aggregation for parameters not in aggregations. Defaults to 'mean'
+     - local_timezone (str, optional): timezone defining the days. Defaults to 'Europe/Copenhagen'
+     - min_count (int, optional): days with fewer records than this for a cell and parameter are left out.
+       Defaults to None, which requires a value for every hour of the local day: 24, or 23 and 25 on the days
+       daylight saving time changes. Partial days, such as the first and last local day of a run of UTC day files,
+       are then left out rather than written as if they were complete. Use 1 to keep every day with a value
+     - deduplicate (str, optional): which revision of an hour to use when DMI has republished it,
+       'latest' or 'qc', see DMIRecords.deduplicate. Defaults to 'latest'
+    """
+
+    methods = ('sum', 'mean', 'min', 'max')
+
+
+    def __init__(self, aggregations = None, default = 'mean', local_timezone = 'Europe/Copenhagen', min_count = None, deduplicate = 'latest'):
+        if deduplicate not in ('latest', 'qc'):
+            raise ValueError(f"deduplicate must be 'latest' or 'qc', got {deduplicate}")
+
+        self.aggregations = aggregations or {}
+        self.default = default
+        self.local_timezone = ZoneInfo(local_timezone)
+        self.min_count = min_count
+        self.deduplicate = deduplicate
+
+        for method in list(self.aggregations.values()) + [default]:
+            if method not in self.methods:
+                raise ValueError(f"Unknown aggregation '{method}'. Options are: {', '.join(self.methods)}")
+
+
+    def local_days(self, timestamps):
+        """
+        Takes an array of ISO timestamps and returns the local dates they fall on as datetime64[D]
+        Only the unique timestamps are converted, as an hourly day file holds few distinct timestamps.
+        """
+        unique_timestamps, inverse = np.unique(timestamps, return_inverse=True)
+        unique_days = np.array([
+            datetime.fromisoformat(timestamp).astimezone(self.local_timezone).date().isoformat()
+            for timestamp in unique_timestamps
+        ], dtype='datetime64[D]')
+
+        return unique_days[inverse.ravel()]
+
+
+    def aggregate(self, records):
+        """
+        Aggregates records into one daily record per parameterId, cellId and local day.
+        Only one revision of each hour is used, so republished values are not counted twice
+
+        Parameters:
+        - records (list of DMIRecord): hourly records
+
+        Returns:
+        - list of DMIRecord: daily records, sorted by day, parameterId and cellId
+        """
+        records, _ = DMIRecords.deduplicate(records, self.deduplicate)
+        if not records:
+            return []
+
+        parameter_ids, parameter_codes = np.unique([record.parameter_id for record in records], return_inverse=True)
+        cell_ids, cell_codes = np.unique([record.cell_id for record in records], return_inverse=True)
+        days, day_codes = np.unique(self.local_days([record.time_from for record in records]), return_inverse=True)
+        values = np.array([np.nan if record.value is None else record.value for record in records], dtype=np.float64)
+
+        parameter_codes, cell_codes, day_codes = parameter_codes.ravel(), cell_codes.ravel(), day_codes.ravel()
+
+        valid = ~np.isnan(values)
+        group_codes = (day_codes * len(parameter_ids) + parameter_codes) * len(cell_ids) + cell_codes
+        groups, group_index = np.unique(group_codes[valid], return_inverse=True)
+        group_index = group_index.ravel()
+        values = values[valid]
+
+        counts = np.bincount(group_index, minlength=len(groups))
+        sums = np.bincount(group_index, weights=values, minlength=len(groups))
+        minimums = np.full(len(groups), np.inf)
+        maximums = np.full(len(groups), -np.inf)
+        np.minimum.at(minimums, group_index, values)
+        np.maximum.at(maximums, group_index, values)
+
+        results = {'sum': sums, 'mean': sums / np.maximum(counts, 1), 'min': minimums, 'max': maximums}
+
+        if self.min_count is None:
+            required = np.array([self.day_hours(day) for day in days])[groups // (len(cell_ids) * len(parameter_ids))]
+        else:
+            required = np.full(len(groups), self.min_count)
+
+        bboxes = {}
+        for record in records:
+            bboxes.setdefault(record.cell_id, record.bbox)
+
+        daily_records = []
+        for group, group_code in enumerate(groups):
+            if counts[group] < required[group]: continue
+
+            cell_code = group_code % len(cell_ids)
+            parameter_code = (group_code // len(cell_ids)) % len(parameter_ids)
+            day_code = group_code // (len(cell_ids) * len(parameter_ids))
+
+            parameter_id = str(parameter_ids[parameter_code])
+            cell_id = str(cell_ids[cell_code])
+            time_from, time_to = self.day_bounds(days[day_code])
+            method = self.aggregations.get(parameter_id, self.default)
+
+            daily_records.append(DMIRecord(
+                cell_id = cell_id,
+                parameter_id = parameter_id,
+                value = round(float(results[method][group]), 6),
+                bbox = bboxes[cell_id],
+                time_from = time_from,
+                time_to = time_to,
+                created = None,
+                qc_status = None,
+                time_resolution = 'day',
+                id = None,
+            ))
+
+        return daily_records
+
+
+    def day_bounds(self, day):
+        """
+        Returns local midnight at the start and end of a day as UTC ISO timestamps
+        """
+        day = datetime.fromisoformat(str(day))
+        start = day.replace(tzinfo=self.local_timezone)
+        end = (day + timedelta(days=1)).replace(tzinfo=self.local_timezone)
+        return start.astimezone(timezone.utc).isoformat(), end.astimezone(timezone.utc).isoformat()
+
+
+    def day_hours(self, day):
+        """
+        Returns the number of hours in a local day, 23 or 25 when daylight saving time changes
+        """
+        time_from, time_to = self.day_bounds(day)
+        return int((datetime.fromisoformat(time_to) - datetime.fromisoformat(time_from)) / timedelta(hours=1))
+
+
+    def aggregate_files(self, dmi_files, output_dir, params = None, cells = None):
+        """
+        Streams hourly DMI climate grid files and writes daily YYYY-MM-DD.txt files in the format DMITools reads.
+
+        The files are read in date order. Only the records of the last two local days read are held
+        in memory, earlier days are complete and are aggregated and written as soon as they are passed.
+        Local days are offset from the UTC days of the files, so the first and last local day are only partly
+        covered. With the default min_count these are left out, see DMIAggregator.
+
+        Parameters:
+        - dmi_files (list of str): hourly DMI climate grid files, .txt, .txt.gz or .txt.zst
+        - output_dir (str path): directory for the daily files
+        - params (list of str, optional): only aggregate these parameterIds
+        - cells (list of str, optional): only aggregate these cellIds
+
+        Returns:
+        - list of str: the written daily files
+        """
+        os.makedirs(output_dir, exist_ok=True)
+
+        pending = []
+        written = []
+        for dmi_file in sorted(dmi_files, key=DMIFiles.strip_extension):
+            pending.extend(DMIRecords.iter_records(dmi_file, params = params, cells = cells))
+            if not pending: continue
+
+            record_days = self.local_days([record.time_from for record in pending])
+            complete = record_days < record_days.max() - np.timedelta64(1, 'D')
+
+            written.extend(self.write_day_files(
+                self.aggregate([record for record, done in zip(pending, complete) if done]),
+                output_dir
+                ))
+            pending = [record for record, done in zip(pending, complete) if not done]
+
+        written.extend(self.write_day_files(self.aggregate(pending), output_dir))
+        return written
+
+
+    def write_day_files(self, daily_records, output_dir):
+        """
+        Writes daily records to one YYYY-MM-DD.txt file per local day
+        Returns the written files
+        """
+        by_day = {}
+        for record in daily_records:
+            day = datetime.fromisoformat(record.time_from).astimezone(self.local_timezone).date().isoformat()
+            by_day.setdefault(day, []).append(record)
+
+        written = []
+        for day, records in sorted(by_day.items()):
+            output_path = os.path.join(output_dir, day + '.txt')
+            with open(output_path, 'w') as file:
+                for record in records:
+                    file.write(DMIRecords.to_json(record) + '\n')
+            written.append(output_path)
+
+        return written
@@ -0,0 +1,192 @@
+import os
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+from tools.dmi_tools.dmi_files import DMIFiles
+from tools.dmi_tools.dmi_records import DMIRecords
+
+
+class DMICatalog:
+    """
+    Cached summary of the DMI climate grid files in a directory.
+
+    The directory is scanned once, in parallel, recording per file the date, the parameters with their
+    cell counts and the qcStatus counts. The summary is saved as _catalog.json in the directory and only
+    new or changed files are scanned again on later refreshes, so pipelines can check that the dates,
+    parameters and cells they need are there before starting. Files are keyed by their absolute path,
+    so copies of a day, e.g. a .txt and a .txt.gz file, each keep their own summary.
+
+    Parameters:
+     - climate_data_dir (str path): path to directory with DMI climate grid files
+     - catalog_path (str path, optional): where to cache the catalog. Defaults to _catalog.json in climate_data_dir
+     - processes (int, optional): number of processes used for scanning. Defaults to one per CPU
+     - refresh (bool, optional): scan new and changed files when the catalog is created. Defaults to True
+    """
+
+    def __init__(self, climate_data_dir, catalog_path = None, processes = None, refresh = True):
+        self.climate_data_dir = climate_data_dir
+        self.catalog_path = catalog_path or os.path.join(climate_data_dir, '_catalog.json')
+        self.processes = processes
+
+        self.files = {}
+        if os.path.exists(self.catalog_path):
+            with open(self.catalog_path, 'r') as file:
+                self.files = json.load(file)
+
+        if refresh:
+            self.refresh()
+
+
+    def refresh(self):
+        """
+        Scans files that are new or changed since the last scan, drops removed files and saves the catalog
+
+        Returns:
+        - list of str: the scanned files
+        """
+        climate_files = DMIFiles.list_files(self.climate_data_dir)
+        current = {os.path.abspath(climate_file): climate_file for climate_file in climate_files}
+
+        removed = set(self.files) - set(current)
+        for path in removed:
+            del self.files[path]
+
+        changed = [
+            climate_file for path, climate_file in current.items()
+            if not self.files.get(path, {}).get('stats') == get_file_stats(climate_file)
+        ]
+
+        if changed:
+            with ProcessPoolExecutor(max_workers = self.processes) as executor:
+                for climate_file, summary in zip(changed, executor.map(summarize_file, changed)):
+                    self.files[os.path.abspath(climate_file)] = summary
+
+        if changed or removed or not os.path.exists(self.catalog_path):
+            with open(self.catalog_path, 'w') as file:
+                json.dump(self.files, file, indent=1, sort_keys=True)
+
+        return changed
+
+
+    def get_summaries(self, param = None):
+        """
+        Returns the file summaries sorted by date, optionally only those containing param
+        """
+        summaries = sorted(self.files.values(), key = lambda summary: summary['date'])
+        if param is None:
+            return summaries
+        return [summary for summary in summaries if param in summary['parameters']]
+
+
+    def get_summary(self, date):
+        """
+        Takes a date string in format YYYY-MM-DD or a datetime object
+        Returns the summary of the file for that date, None if there is no file.
+        If there are several files for the date, the summary of the one DMIFiles.find_file picks is returned
+        """
+        if isinstance(date, datetime):
+            date = date.strftime('%Y-%m-%d')
+
+        summaries = {
+            os.path.basename(path)[len(date):]: summary
+            for path, summary in self.files.items() if summary['date'] == date
+        }
+        for extension in DMIFiles.extensions:
+            if extension in summaries:
+                return summaries[extension]
+        return next(iter(summaries.values()), None)
+
+
+    def parameters(self):
+        """
+        Returns the set of parameterIds found in any file
+        """
+        return {param for summary in self.files.values() for param in summary['parameters']}
+
+
+    def dates(self, param = None):
+        """
+        Returns the sorted dates (YYYY-MM-DD strings) with files, optionally only those containing param
+        """
+        return sorted({summary['date'] for summary in self.get_summaries(param)})
+
+
+    def missing_dates(self, param, start, end):
+        """
+        Returns the dates in the inclusive range start - end without values for param
+        Dates are YYYY-MM-DD strings or datetime objects
+        """
+        if isinstance(start, str): start = datetime.strptime(start, '%Y-%m-%d')
+        if isinstance(end, str): end = datetime.strptime(end, '%Y-%m-%d')
+
+        available = set(self.dates(param))
+        dates = [(start + timedelta(days = i)).strftime('%Y-%m-%d') for i in range((end - start).days + 1)]
+        return [date for date in dates if date not in available]
+
+
+    def validate(self, params, start, end, min_cells = None):
+        """
+        Checks that every parameter is present for every date in the inclusive range start - end,
+        optionally with at least min_cells cells.
+
+        Returns:
+        - list of str: descriptions of the problems found, empty if the data is complete
+        """
+        if isinstance(params, str): params = [params]
+
+        problems = []
+        for param in params:
+            missing = self.missing_dates(param, start, end)
+            if missing:
+                problems.append(f'{param} missing for {len(missing)} dates: {", ".join(missing[:10])}{" ..." if len(missing) > 10 else ""}')
+
+            if min_cells is None: continue
+
+            sparse = sorted({
+                summary['date'] for summary in self.get_summaries(param)
+                if str(start)[:10] <= summary['date'] <= str(end)[:10] and summary['parameters'][param] < min_cells
+            })
+            if sparse:
+                problems.append(f'{param} has fewer than {min_cells} cells on {len(sparse)} dates: {", ".join(sparse[:10])}{" ..." if len(sparse) > 10 else ""}')
+
+        return problems
+
+
+def get_file_stats(climate_file):
+    stats = os.stat(climate_file)
+    return [stats.st_size, stats.st_mtime_ns]
+
+
+def summarize_file(climate_file):
+    """
+    Reads a DMI climate grid file once and returns its date,
+    the number of cells per parameterId and the number of records per qcStatus
+    """
+    cells = {}
+    qc_status = Counter()
+    records = 0
+    for line in DMIFiles.iter_lines(climate_file):
+        properties = DMIRecords.loads(line).get('properties', {})
+        cells.setdefault(properties.get('parameterId'), set()).add(properties.get('cellId'))
+        qc_status[str(properties.get('qcStatus'))] += 1
+        records += 1
+
+    return {
+        'date': DMIFiles.strip_extension(climate_file),
+        'stats': get_file_stats(climate_file),
+        'records': records,
+        'parameters': {str(param): len(param_cells) for param, param_cells in cells.items()},
+        'cells': len(set().union(*cells.values())),
+        'qc_status': dict(qc_status),
+    }
+
+
+if __name__ == "__main__":
+    climate_data_dir = "J:/javej/drought/drought_et/dmi_climate_grid/raw_files/"
+
+    catalog = DMICatalog(climate_data_dir)
+    problems = catalog.validate(["pot_evaporation_makkink"], '2023-01-01', '2023-12-31', min_cells = 600)
+
+    print('\n'.join(problems) if problems else 'Climate data complete')
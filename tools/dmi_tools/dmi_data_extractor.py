@@ -4,35 +4,129 @@
 import glob
 import sys
 import os
-import json
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+
+from tools.dmi_tools.dmi_files import DMIFiles
+from tools.dmi_tools.dmi_offset_index import DMIOffsetIndex
+from tools.dmi_tools.dmi_records import DMIRecords
 
 class climate_data_searcher:
     """
     Tools for handling DMI gridded climate data. 
-    Assumes filenames in format YYYY-MM-DD.txt
+    Assumes filenames in format YYYY-MM-DD.txt, optionally compressed as .txt.gz or .txt.zst
 
     While this will work on data directly from DMI, using the filter function ahead of time will speed up use.
+
+    Day files are found through a date lookup. The first search in a day file builds a
+    (parameterId, cellId) -> value index of it, and the indices of the cache_size most
+    recently used files are kept, so repeated lookups on a day do not read the file again.
     """
 
-    def __init__(self, climate_data_dir, filter_params = False, filter_dates = False, filter_tiles = False):
+    def __init__(self, climate_data_dir, filter_params = False, filter_dates = False, filter_tiles = False, cache_size = 32, use_offset_index = False):
+        """
+        Parameters:
+         - climate_data_dir (str path): path to directory with DMI climate grid files
+         - filter_params (list of str, optional): only keep these parameterIds. Example: ["pot_evaporation_makkink"]
+         - filter_dates (list or tuple, optional): only keep these dates. A list gives the dates to keep, a tuple 
+           (start, end) gives an inclusive date range. Dates are YYYY-MM-DD strings or datetime objects
+         - filter_tiles (list of str, optional): only keep these cellIds. Example: ['10km_615_66']
+         - cache_size (int, optional): number of day file indices to keep in memory. Defaults to 32
+         - use_offset_index (bool, optional): look values up through DMIOffsetIndex sidecar files, which are built on
+           first use and only read the requested records afterwards. Only used for uncompressed files. Defaults to False
+
+        Date filters prune the file list before any file is read, parameter and tile filters
+        are applied while the day files are streamed, so only the filtered values are indexed.
+        """
 
         def build_climate_file_list(climate_data_dir):
             climate_files = []
-            for climate_file in glob.glob(climate_data_dir + '*.txt'):
-                date = os.path.basename(os.path.splitext(climate_file)[0])
+            for climate_file in DMIFiles.list_files(climate_data_dir):
+                date = DMIFiles.strip_extension(climate_file)
                 date = datetime.strptime(date, "%Y-%m-%d")
 
+                if not date_filter(date.date()): continue
+
                 climate_files.append((date, climate_file))
 
             return climate_files
 
-        #TODO Implement the different filters
-        params = [filter_params, filter_dates, filter_tiles]
-        if all(param is False or param is None for param in params):
-            pass
+        def build_date_filter(filter_dates):
+            if not filter_dates:
+                return lambda date: True
+
+            if isinstance(filter_dates, tuple):
+                start, end = [to_date(date) for date in filter_dates]
+                return lambda date: start <= date <= end
+
+            dates = {to_date(date) for date in filter_dates}
+            return lambda date: date in dates
+
+        def to_date(date):
+            if isinstance(date, str):
+                date = datetime.strptime(date, "%Y-%m-%d")
+            if isinstance(date, datetime):
+                date = date.date()
+            return date
+
+        def to_list(filter_values):
+            if not filter_values:
+                return None
+            if isinstance(filter_values, str):
+                return [filter_values]
+            return list(filter_values)
+
+        date_filter = build_date_filter(filter_dates)
+        self.filter_params = to_list(filter_params)
+        self.filter_tiles = to_list(filter_tiles)
         
         self.climate_files = build_climate_file_list(climate_data_dir)
+        self.climate_file_lookup = {file_date.date(): climate_file for file_date, climate_file in self.climate_files}
+
+        # Cached per file and modification time, so a rewritten day file is read again
+        self.cached_file_index = lru_cache(maxsize = cache_size)(lambda climate_file, mtime: self.build_file_index(climate_file))
+        self.use_offset_index = use_offset_index
+        self.cached_offset_index = lru_cache(maxsize = cache_size)(lambda climate_file, mtime: DMIOffsetIndex(climate_file))
+
+
+    def get_file_index(self, climate_file):
+        return self.cached_file_index(climate_file, os.path.getmtime(climate_file))
+
+
+    def get_offset_index(self, climate_file):
+        return self.cached_offset_index(climate_file, os.path.getmtime(climate_file))
+
+
+    def build_file_index(self, climate_file):
+        """
+        Reads a climate file once and returns a dict of (parameterId, cellId) -> value
+        for the records passing the parameter and tile filters.
+        Of several revisions of a value the latest is used, see DMIRecords.revision_value
+        """
+        return {
+            key: DMIRecords.revision_value(records)
+            for key, records in group_records(climate_file, self.filter_params, self.filter_tiles).items()
+        }
+
+
+    def find_climate_file(self, search_date):
+        """
+        Takes a date string in format YYYY-MM-DD or a datetime object
+        Returns the matching climate file, None if there is no file for the date
+        """
+        file_date = search_date
+        if isinstance(file_date, str):
+            file_date = datetime.strptime(file_date, "%Y-%m-%d")
+        if isinstance(file_date, datetime):
+            file_date = file_date.date()
+
+        climate_file = self.climate_file_lookup.get(file_date)
+        if climate_file is None:
+            print(f'{search_date} not in climate file list. Is the climate data filtered too aggressively?')
+
+        return climate_file
 
 
     def search_climate_parameters(self, param, date, tile, coordinates = False):
@@ -45,39 +139,132 @@ class climate_data_searcher:
         """
         #TODO maybe return a list of results if one or more parameters are unfilled?
 
-        def find_climate_file(climate_files, search_date):
-            for file_date, filename in climate_files:
-                if datetime.strptime(search_date, "%Y-%m-%d") == file_date:
-                    return filename
-                
-            print(f'{search_date} not in climate file list. Is the climate data filtered too aggressively?')
-            return None
-
-        def search_climate_file(climate_file, param, tile):
-            with open(climate_file, 'r') as file:
-                lines = [line.rstrip() for line in file]
-                for json_str in lines:
-                    data = json.loads(json_str)
-                    if not tile == data['properties']['cellId']:
-                        continue
-                    if not param == data['properties']['parameterId']:
-                        continue
-                    
-                    return data['properties']['value']
-                
-                print(f'Either {tile} or {param} not in {climate_file}. Is the climate data filtered too aggressively?')
-                return None
-
         if not param or not date or not tile:
             raise ValueError("All inputs (param, date, tile) must be provided and cannot be None or False.")
         
-        climate_file = find_climate_file(self.climate_files, date)
+        climate_file = self.find_climate_file(date)
         if climate_file == None: return None
-        value = search_climate_file(climate_file, param, tile)
-        if value == None: return None
+
+        value = self.search_climate_file(climate_file, param, tile)
+        if value == None:
+            print(f'Either {tile} or {param} not in {climate_file}. Is the climate data filtered too aggressively?')
+            return None
         return value
     
 
+    def search_climate_file(self, climate_file, param, tile):
+        """
+        Returns the value of a parameter and tile in a climate file, None if it is not there
+        """
+        if self.use_offset_index and climate_file.endswith('.txt'):
+            if self.filter_params is not None and param not in self.filter_params: return None
+            if self.filter_tiles is not None and tile not in self.filter_tiles: return None
+            return self.get_offset_index(climate_file).get_value(param, tile)
+
+        return self.get_file_index(climate_file).get((param, tile))
+
+
+    def get_series(self, params, cells, start, end, max_workers = 8, processes = None, as_dataframe = False):
+        """
+        Takes lists of parameters and tile IDs and an inclusive date range and returns
+        the values for every day, cell and parameter in one batch.
+        Each day file is read at most once, and the days are read in parallel.
+        Like the other lookups, only parameters and cells passing filter_params and filter_tiles are read,
+        the others are NaN.
+
+        Parameters:
+         - params (list of str): parameterIds. Example: ["pot_evaporation_makkink"]
+         - cells (list of str): cellIds. Example: ['10km_615_66', '10km_621_51']
+         - start, end (str or datetime): first and last date, YYYY-MM-DD strings or datetime objects
+         - max_workers (int, optional): number of days read at a time. Defaults to 8
+         - processes (int, optional): if given, days are read in this many worker processes instead of threads.
+           0 uses one process per CPU
+         - as_dataframe (bool, optional): return a pandas DataFrame with a date index and (parameter, cell) columns
+
+        Returns:
+         - dates (list of datetime.date): every date in the range
+         - values (numpy array): float array of shape (dates, cells, params), NaN where there is no value
+        or a DataFrame if as_dataframe is True
+        """
+
+        def to_date(date):
+            if isinstance(date, str):
+                date = datetime.strptime(date, "%Y-%m-%d")
+            if isinstance(date, datetime):
+                date = date.date()
+            return date
+
+        if isinstance(params, str): params = [params]
+        if isinstance(cells, str): cells = [cells]
+
+        start, end = to_date(start), to_date(end)
+        dates = [start + timedelta(days = i) for i in range((end - start).days + 1)]
+        values = np.full((len(dates), len(cells), len(params)), np.nan)
+
+        day_files = [(i, self.climate_file_lookup[date]) for i, date in enumerate(dates) if date in self.climate_file_lookup]
+
+        param_selection = [i for i, param in enumerate(params) if self.filter_params is None or param in self.filter_params]
+        cell_selection = [i for i, cell in enumerate(cells) if self.filter_tiles is None or cell in self.filter_tiles]
+        if not param_selection or not cell_selection:
+            day_files = []
+        selection = np.ix_(cell_selection, param_selection)
+
+        if processes is None:
+            executor = ThreadPoolExecutor(max_workers = max_workers)
+        else:
+            executor = ProcessPoolExecutor(max_workers = processes or None)
+
+        with executor:
+            day_values = executor.map(
+                extract_file_values, 
+                [climate_file for _, climate_file in day_files], 
+                [[params[j] for j in param_selection]] * len(day_files), 
+                [[cells[j] for j in cell_selection]] * len(day_files)
+            )
+
+            for (i, _), file_values in zip(day_files, day_values):
+                values[i][selection] = file_values
+
+        if not as_dataframe:
+            return dates, values
+
+        import pandas as pd
+
+        columns = pd.MultiIndex.from_product([cells, params], names = ['cellId', 'parameterId'])
+        dataframe = pd.DataFrame(values.reshape(len(dates), -1), index = pd.to_datetime(dates), columns = columns)
+        dataframe.index.name = 'date'
+        return dataframe.swaplevel(axis = 1).sort_index(axis = 1)
+
+
+def extract_file_values(climate_file, params, cells):
+    """
+    Reads a climate file once and returns a float array of shape (cells, params)
+    with the values of the given cells and parameters, NaN where there is no value.
+    Of several revisions of a value the latest is used, see DMIRecords.revision_value.
+    A cell given more than once, e.g. for several sites in one cell, gets its values in each of its rows
+    """
+    unique_cells = list(dict.fromkeys(cells))
+    cell_index = {cell: i for i, cell in enumerate(unique_cells)}
+    param_index = {param: i for i, param in enumerate(params)}
+
+    values = np.full((len(unique_cells), len(params)), np.nan)
+    for (param, cell), records in group_records(climate_file, params, unique_cells).items():
+        value = DMIRecords.revision_value(records)
+        values[cell_index[cell], param_index[param]] = np.nan if value is None else value
+
+    return values[[cell_index[cell] for cell in cells]]
+
+
+def group_records(climate_file, params = None, cells = None):
+    """
+    Reads a climate file once and returns a dict of (parameterId, cellId) -> list of DMIRecord
+    """
+    records = {}
+    for record in DMIRecords.iter_records(climate_file, params = params, cells = cells):
+        records.setdefault((record.parameter_id, record.cell_id), []).append(record)
+    return records
+
+
 if __name__ == "__main__":
     climate_data_dir = "J:/javej/dmi_climate_grid/"
     output_file_dir = "/"
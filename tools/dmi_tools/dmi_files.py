@@ -0,0 +1,93 @@
+import glob
+import gzip
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class DMIFiles:
+    """
+    Tools for finding and reading DMI climate grid day files.
+    Assumes filenames in format YYYY-MM-DD.txt, optionally compressed as YYYY-MM-DD.txt.gz or YYYY-MM-DD.txt.zst
+
+    Files are read as a stream of lines, so memory use does not depend on the file size.
+    Reading .zst files requires the zstandard package.
+    """
+
+    extensions = ('.txt', '.txt.gz', '.txt.zst')
+
+
+    def open(dmi_file):
+        """
+        Opens a DMI climate grid file for binary reading, decompressing it if needed
+        """
+        if dmi_file.endswith('.gz'):
+            return gzip.open(dmi_file, 'rb')
+
+        if dmi_file.endswith('.zst'):
+            if zstandard is None:
+                raise ImportError(f"zstandard is required to read {dmi_file}")
+            return zstandard.open(dmi_file, 'rb')
+
+        return open(dmi_file, 'rb')
+
+
+    def iter_lines(dmi_file, contains = None):
+        """
+        Yields the non-empty lines of a DMI climate grid file as bytes, without trailing whitespace
+
+        Parameters:
+        - dmi_file (str): path to a .txt, .txt.gz or .txt.zst file
+        - contains (list of str, optional): only yield lines containing at least one of these strings
+        """
+        if contains is not None:
+            contains = [string.encode('utf-8') for string in contains]
+
+        with DMIFiles.open(dmi_file) as file:
+            for line in file:
+                if contains is not None and not any(string in line for string in contains):
+                    continue
+
+                line = line.rstrip()
+                if line:
+                    yield line
+
+
+    def list_files(climate_data_dir):
+        """
+        Returns a sorted list of all DMI climate grid files in a directory, compressed or not
+        """
+        climate_files = []
+        for extension in DMIFiles.extensions:
+            climate_files.extend(glob.glob(os.path.join(climate_data_dir, '*' + extension)))
+
+        return sorted(climate_files)
+
+
+    def strip_extension(dmi_file):
+        """
+        Returns the filename of a DMI climate grid file without directory and extension.
+        Example: 'raw/2023-05-07.txt.gz' -> '2023-05-07'
+        """
+        filename = os.path.basename(dmi_file)
+        for extension in sorted(DMIFiles.extensions, key = len, reverse = True):
+            if filename.endswith(extension):
+                return filename[:-len(extension)]
+
+        return os.path.splitext(filename)[0]
+
+
+    def find_file(climate_data_dir, name):
+        """
+        Returns the path of the DMI climate grid file called name in climate_data_dir,
+        preferring uncompressed files. Defaults to the .txt path if no file exists.
+        """
+        for extension in DMIFiles.extensions:
+            dmi_file = os.path.join(climate_data_dir, name + extension)
+            if os.path.exists(dmi_file):
+                return dmi_file
+
+        return os.path.join(climate_data_dir, name + DMIFiles.extensions[0])
@@ -0,0 +1,188 @@
+import re
+import numpy as np
+from rasterio.transform import from_origin
+from pyproj import Transformer
+
+
+class DMIGrid:
+    """
+    Tools for working with the DMI climate grid directly through cellIds.
+
+    DMI grid cellIds like '10km_615_66' encode the south-west corner of the cell in the
+    Danish national grid (EPSG:25832), counted in units of the cell size. '10km_615_66' is
+    the 10 km cell with its lower left corner at N 6150000, E 660000.
+    Values can therefore be placed on a raster with integer array arithmetic instead of
+    building, unioning and rasterizing polygons.
+    """
+
+    crs = 'EPSG:25832'
+
+    #(minx, miny, maxx, maxy) in EPSG:25832, covers Denmark and is aligned to the 1, 10 and 20 km grids
+    national_bounds = (420000, 6040000, 900000, 6420000)
+
+    cell_id_pattern = re.compile(r'^(\d+)km_(\d+)_(\d+)$')
+
+    #pixel rows projected at a time in label_grid, bounds memory use on large rasters
+    rows_per_chunk = 512
+
+
+    def parse_cell_id(cell_id):
+        """
+        Decodes a DMI grid cellId
+
+        Parameters:
+        - cell_id (str): DMI grid cellId. Example: '10km_615_66'
+
+        Returns:
+        - tuple: (cell_size, northing_index, easting_index), cell_size in meters
+        """
+        match = DMIGrid.cell_id_pattern.match(cell_id)
+        if match is None:
+            raise ValueError(f"'{cell_id}' is not a DMI grid cellId")
+
+        size_km, northing, easting = match.groups()
+        return int(size_km) * 1000, int(northing), int(easting)
+
+
+    def cell_ids_to_indices(cell_ids):
+        """
+        Decodes a list of DMI grid cellIds of the same cell size
+
+        Returns:
+        - tuple: (cell_size, northing_indices, easting_indices), indices as int arrays
+        """
+        decoded = [DMIGrid.parse_cell_id(cell_id) for cell_id in cell_ids]
+        if not decoded:
+            raise ValueError("No cellIds given")
+
+        cell_sizes = {size for size, _, _ in decoded}
+        if len(cell_sizes) > 1:
+            raise ValueError(f"cellIds from several grid resolutions given: {sorted(cell_sizes)}")
+
+        northing = np.fromiter((north for _, north, _ in decoded), dtype=np.int64, count=len(decoded))
+        easting = np.fromiter((east for _, _, east in decoded), dtype=np.int64, count=len(decoded))
+        return cell_sizes.pop(), northing, easting
+
+
+    def cell_bounds(cell_id):
+        """
+        Returns the bounds (minx, miny, maxx, maxy) of a DMI grid cell in EPSG:25832
+        """
+        cell_size, northing, easting = DMIGrid.parse_cell_id(cell_id)
+        return (easting * cell_size, northing * cell_size, (easting + 1) * cell_size, (northing + 1) * cell_size)
+
+
+    def cells_to_array(cell_ids, values, upsample = 1, nodata = 0, bounds = None, dtype = np.float32):
+        """
+        Scatters DMI grid values straight into a north-up array in EPSG:25832.
+
+        Parameters:
+        - cell_ids (list of str): DMI grid cellIds of the same cell size
+        - values (list of float): values matching cell_ids
+        - upsample (int, optional): integer factor each cell is repeated by along both axes.
+          Defaults to 1, the native grid resolution
+        - nodata (float, optional): value of pixels not covered by any cell. Defaults to 0
+        - bounds (tuple, optional): (minx, miny, maxx, maxy) in EPSG:25832, must be aligned to the cell size.
+          Defaults to the extent of the given cells. Cells outside the bounds are dropped.
+          Use DMIGrid.national_bounds for a fixed national grid
+        - dtype (numpy dtype, optional): dtype of the array. Defaults to float32
+
+        Returns:
+        - array: 2D numpy array
+        - transform: Affine transform of the array
+        """
+
+        if int(upsample) != upsample or upsample < 1:
+            raise ValueError(f"upsample must be a positive integer, got {upsample}")
+        upsample = int(upsample)
+
+        cell_size, northing, easting = DMIGrid.cell_ids_to_indices(cell_ids)
+        values = np.asarray(values, dtype=dtype)
+
+        if bounds is None:
+            min_east, max_east = int(easting.min()), int(easting.max()) + 1
+            min_north, max_north = int(northing.min()), int(northing.max()) + 1
+        else:
+            minx, miny, maxx, maxy = bounds
+            if any(coordinate % cell_size for coordinate in bounds):
+                raise ValueError(f"bounds {bounds} are not aligned to the {cell_size} m grid")
+            min_east, max_east = int(minx // cell_size), int(maxx // cell_size)
+            min_north, max_north = int(miny // cell_size), int(maxy // cell_size)
+
+        height = max_north - min_north
+        width = max_east - min_east
+
+        rows = max_north - 1 - northing
+        cols = easting - min_east
+        inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+
+        grid = np.full((height, width), nodata, dtype=dtype)
+        grid[rows[inside], cols[inside]] = values[inside]
+
+        if upsample > 1:
+            grid = np.repeat(np.repeat(grid, upsample, axis=0), upsample, axis=1)
+
+        transform = from_origin(min_east * cell_size, max_north * cell_size, cell_size / upsample, cell_size / upsample)
+        return grid, transform
+
+
+    def cells_in_bounds(grid_indices, bounds):
+        """
+        Finds the cells intersecting bounds with index arithmetic, without building geometries
+
+        Parameters:
+        - grid_indices (tuple): (cell_size, northing_indices, easting_indices) as returned by cell_ids_to_indices
+        - bounds (tuple): (minx, miny, maxx, maxy) in EPSG:25832
+
+        Returns:
+        - numpy array: boolean mask over the cells
+        """
+        cell_size, northing, easting = grid_indices
+        minx, miny, maxx, maxy = bounds
+
+        return (
+            (easting * cell_size <= maxx) & ((easting + 1) * cell_size >= minx) &
+            (northing * cell_size <= maxy) & ((northing + 1) * cell_size >= miny)
+        )
+
+
+    def label_grid(cell_ids, crs, transform, shape):
+        """
+        Maps each pixel of a raster grid to the DMI cell containing its center.
+        Pixel centers are projected to EPSG:25832 and turned into cell indices by integer division,
+        so the cost depends on the number of pixels and not on the number of cells.
+
+        Parameters:
+        - cell_ids (list of str): DMI grid cellIds of the same cell size
+        - crs (crs str): crs of the raster grid
+        - transform (Affine): transform of the raster grid
+        - shape (tuple): (height, width) of the raster grid
+
+        Returns:
+        - numpy array: int32 array of shape, index into cell_ids for each pixel, -1 outside all cells
+        """
+        cell_size, northing, easting = DMIGrid.cell_ids_to_indices(cell_ids)
+
+        min_north, min_east = int(northing.min()), int(easting.min())
+        lookup = np.full((int(northing.max()) - min_north + 1, int(easting.max()) - min_east + 1), -1, dtype=np.int32)
+        lookup[northing - min_north, easting - min_east] = np.arange(len(cell_ids), dtype=np.int32)
+
+        transformer = Transformer.from_crs(crs, DMIGrid.crs, always_xy=True)
+        labels = np.full(shape, -1, dtype=np.int32)
+
+        cols = np.arange(shape[1]) + 0.5
+        for row in range(0, shape[0], DMIGrid.rows_per_chunk):
+            rows = np.arange(row, min(row + DMIGrid.rows_per_chunk, shape[0]))[:, None] + 0.5
+            xs = transform.c + cols * transform.a + rows * transform.b
+            ys = transform.f + cols * transform.d + rows * transform.e
+            xs, ys = transformer.transform(xs, ys)
+
+            north = np.floor_divide(ys, cell_size).astype(np.int64) - min_north
+            east = np.floor_divide(xs, cell_size).astype(np.int64) - min_east
+            inside = (north >= 0) & (north < lookup.shape[0]) & (east >= 0) & (east < lookup.shape[1])
+
+            chunk = np.full(north.shape, -1, dtype=np.int32)
+            chunk[inside] = lookup[north[inside], east[inside]]
+            labels[row:row + len(rows)] = chunk
+
+        return labels
@@ -0,0 +1,288 @@
+from collections import OrderedDict
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+from pyproj import Transformer
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+from tools.dmi_tools.dmi_grid import DMIGrid
+
+
+class DMIInterpolator:
+    """
+    Inverse distance weighted (IDW) interpolation of DMI station observations onto a raster grid.
+
+    Every pixel center gets the weighted mean of its k nearest stations, with weights 1 / distance ** power.
+    Neighbours and weights depend only on the grid and the station locations, so they are computed once
+    per station set, with a KD-tree when scipy is installed and a chunked numpy search otherwise, and cached.
+    Time steps are then interpolated in batches of array operations. Stations without a value at a time
+    step are left out of that time step and the weights of the other neighbours are renormalized.
+    Batches are chunked over time steps and pixels, so the temporary arrays stay around chunk_elements values
+    however long the time series is.
+
+    Parameters:
+     - transform (Affine): transform of the output grid
+     - shape (tuple): (height, width) of the output grid
+     - crs (crs str, optional): crs of the output grid, distances are measured in it. Defaults to EPSG:25832
+     - k (int, optional): number of nearest stations used per pixel. Defaults to 8
+     - power (float, optional): IDW power. Defaults to 2
+     - max_distance (float, optional): stations further away than this, in grid crs units, are not used.
+       Pixels without stations within max_distance are nodata. Defaults to no limit
+     - nodata (float, optional): value of pixels without stations. Defaults to -9999
+     - cache_size (int, optional): number of station sets to keep weights for. Defaults to 8
+    """
+
+    # Values per temporary array, and time steps per batch
+    chunk_elements = 1 << 22
+    time_chunk_size = 256
+
+
+    def __init__(self, transform, shape, crs = DMIGrid.crs, k = 8, power = 2, max_distance = None, nodata = -9999, cache_size = 8):
+        self.transform = transform
+        self.shape = tuple(shape)
+        self.crs = crs
+        self.k = k
+        self.power = power
+        self.max_distance = max_distance
+        self.nodata = nodata
+        self.cache_size = cache_size
+
+        rows, cols = np.indices(self.shape)
+        xs = transform.c + (cols.ravel() + 0.5) * transform.a + (rows.ravel() + 0.5) * transform.b
+        ys = transform.f + (cols.ravel() + 0.5) * transform.d + (rows.ravel() + 0.5) * transform.e
+        self.pixel_coordinates = np.column_stack([xs, ys])
+
+        self.transformer = Transformer.from_crs('EPSG:4326', crs, always_xy=True)
+        self.weights_cache = OrderedDict()
+
+
+    def from_bounds(bounds, resolution, crs = DMIGrid.crs, **kwargs):
+        """
+        Creates an interpolator for a north-up grid covering bounds
+
+        Parameters:
+        - bounds (tuple): (minx, miny, maxx, maxy) in crs
+        - resolution (float): pixel size in crs units
+        - crs (crs str, optional): crs of the grid. Defaults to EPSG:25832
+        - kwargs: passed on to DMIInterpolator
+
+        Example: DMIInterpolator.from_bounds(DMIGrid.national_bounds, 1000)
+        """
+        minx, miny, maxx, maxy = bounds
+        shape = (int(np.ceil((maxy - miny) / resolution)), int(np.ceil((maxx - minx) / resolution)))
+        return DMIInterpolator(from_origin(minx, maxy, resolution, resolution), shape, crs = crs, **kwargs)
+
+
+    def station_coordinates(self, lons, lats):
+        """
+        Projects station longitudes and latitudes (EPSG:4326) to the grid crs
+        Returns an array of shape (n_stations, 2)
+        """
+        xs, ys = self.transformer.transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        return np.column_stack([xs, ys])
+
+
+    def get_weights(self, coordinates):
+        """
+        Finds the k nearest stations of every pixel and their IDW weights.
+        Results are cached per set of station coordinates.
+
+        Parameters:
+        - coordinates (numpy array): station coordinates in the grid crs, shape (n_stations, 2)
+
+        Returns:
+        - indices (numpy array): station index of each neighbour, shape (n_pixels, k)
+        - weights (numpy array): weight of each neighbour, shape (n_pixels, k), 0 for unused neighbours
+        """
+        coordinates = np.ascontiguousarray(coordinates, dtype=float)
+        key = coordinates.tobytes()
+        if key in self.weights_cache:
+            self.weights_cache.move_to_end(key)
+            return self.weights_cache[key]
+
+        k = min(self.k, len(coordinates))
+        if cKDTree is not None:
+            distances, indices = cKDTree(coordinates).query(self.pixel_coordinates, k=k)
+            distances, indices = distances.reshape(-1, k), indices.reshape(-1, k)
+        else:
+            distances, indices = self.nearest(coordinates, k)
+
+        with np.errstate(divide='ignore'):
+            weights = 1.0 / np.maximum(distances, 1e-9) ** self.power
+
+        if self.max_distance is not None:
+            weights[distances > self.max_distance] = 0
+
+        self.weights_cache[key] = (indices, weights)
+        if len(self.weights_cache) > self.cache_size:
+            self.weights_cache.popitem(last=False)
+
+        return indices, weights
+
+
+    def nearest(self, coordinates, k):
+        """
+        Brute force k nearest neighbour search over pixel chunks, used when scipy is not installed
+        Returns (distances, indices), both of shape (n_pixels, k) and sorted by distance
+        """
+        n_pixels = len(self.pixel_coordinates)
+        distances = np.empty((n_pixels, k))
+        indices = np.empty((n_pixels, k), dtype=np.int64)
+
+        # The distance matrix of a chunk is pixels x stations
+        chunk_size = max(1, self.chunk_elements // len(coordinates))
+        for start in range(0, n_pixels, chunk_size):
+            pixels = self.pixel_coordinates[start:start + chunk_size]
+            chunk_distances = np.hypot(
+                pixels[:, 0, None] - coordinates[None, :, 0],
+                pixels[:, 1, None] - coordinates[None, :, 1]
+            )
+
+            chunk_indices = np.argpartition(chunk_distances, k - 1, axis=1)[:, :k]
+            chunk_distances = np.take_along_axis(chunk_distances, chunk_indices, axis=1)
+            order = np.argsort(chunk_distances, axis=1)
+
+            distances[start:start + len(pixels)] = np.take_along_axis(chunk_distances, order, axis=1)
+            indices[start:start + len(pixels)] = np.take_along_axis(chunk_indices, order, axis=1)
+
+        return distances, indices
+
+
+    def interpolate(self, coordinates, values):
+        """
+        Interpolates station values onto the grid
+
+        Parameters:
+        - coordinates (numpy array): station coordinates in the grid crs, shape (n_stations, 2)
+        - values (numpy array): station values, shape (n_stations,) for one time step
+          or (n_times, n_stations) for a batch. NaN marks missing values
+
+        Returns:
+        - numpy array: interpolated grid, shape (height, width) or (n_times, height, width)
+        """
+        values = np.asarray(values, dtype=float)
+        single = values.ndim == 1
+        values = np.atleast_2d(values)
+
+        indices, weights = self.get_weights(coordinates)
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0)
+
+        output = np.empty((len(values), len(indices)), dtype=np.float32)
+        for time_start in range(0, len(values), self.time_chunk_size):
+            times = slice(time_start, time_start + self.time_chunk_size)
+            n_times = len(values[times])
+
+            # The neighbour values of a chunk are times x pixels x k
+            chunk_size = max(1, self.chunk_elements // (n_times * indices.shape[1]))
+            for start in range(0, len(indices), chunk_size):
+                chunk_indices = indices[start:start + chunk_size]
+                chunk_weights = weights[start:start + chunk_size]
+
+                numerator = np.einsum('tpk,pk->tp', filled[times][:, chunk_indices], chunk_weights)
+                denominator = np.einsum('tpk,pk->tp', valid[times][:, chunk_indices], chunk_weights)
+
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    output[times, start:start + len(chunk_indices)] = np.where(denominator > 0, numerator / denominator, self.nodata)
+
+        output = output.reshape((len(values),) + self.shape)
+        return output[0] if single else output
+
+
+    def interpolate_observations(self, observations):
+        """
+        Interpolates metObs observations, as returned by DMIOpenDataClient.get_observations, onto the grid.
+        Observations are grouped by their observed timestamp, each timestamp becomes one grid.
+
+        Parameters:
+        - observations (list of dict): GeoJSON observation features of one parameter
+
+        Returns:
+        - times (list of str): the observed timestamps, sorted
+        - grids (numpy array): interpolated grids, shape (n_times, height, width)
+        """
+        stations = {}
+        times = {}
+        samples = []
+        for observation in observations:
+            properties = observation.get('properties', {})
+            coordinates = (observation.get('geometry') or {}).get('coordinates')
+            if coordinates is None or properties.get('value') is None:
+                continue
+
+            station = (properties.get('stationId'), coordinates[0], coordinates[1])
+            station_index = stations.setdefault(station, len(stations))
+            time_index = times.setdefault(properties.get('observed'), len(times))
+            samples.append((time_index, station_index, properties['value']))
+
+        if not stations:
+            return [], np.empty((0,) + self.shape, dtype=np.float32)
+
+        values = np.full((len(times), len(stations)), np.nan)
+        for time_index, station_index, value in samples:
+            values[time_index, station_index] = value
+
+        time_list = list(times)
+        order = sorted(range(len(time_list)), key=lambda i: time_list[i])
+        coordinates = self.station_coordinates(
+            [lon for _, lon, _ in stations],
+            [lat for _, _, lat in stations]
+        )
+
+        return [time_list[i] for i in order], self.interpolate(coordinates, values[order])
+
+
+    def write(self, grids, output_file, descriptions = None):
+        """
+        Writes interpolated grids to a multi-band GeoTIFF, one band per time step
+
+        Parameters:
+        - grids (numpy array): shape (height, width) or (n_times, height, width)
+        - output_file (str path): path of the GeoTIFF
+        - descriptions (list of str, optional): band descriptions, e.g. the timestamps
+        """
+        grids = np.asarray(grids, dtype=np.float32).reshape((-1,) + self.shape)
+
+        with rasterio.open(
+            output_file,
+            'w',
+            driver='GTiff',
+            height=self.shape[0],
+            width=self.shape[1],
+            count=len(grids),
+            dtype='float32',
+            crs=self.crs,
+            transform=self.transform,
+            nodata=self.nodata,
+            compress='deflate',
+        ) as dst:
+            dst.write(grids)
+            for band, description in enumerate(descriptions or [], start=1):
+                dst.set_band_description(band, description)
+
+
+if __name__ == "__main__":
+    import os
+    import netrc
+    import sys
+    from datetime import datetime
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), '../../API/dmi_api/api'))
+    from dmi_open_data import DMIOpenDataClient, Parameter
+
+    _, _, api_key = netrc.netrc().authenticators('dmi_climate_data_api')
+    client = DMIOpenDataClient(api_key=api_key)
+
+    observations = client.get_observations(
+        parameter=Parameter.TempDry,
+        from_time=datetime(2023, 5, 2),
+        to_time=datetime(2023, 5, 3),
+    )
+
+    interpolator = DMIInterpolator.from_bounds(DMIGrid.national_bounds, 1000, k=6)
+    times, grids = interpolator.interpolate_observations(observations)
+    interpolator.write(grids, 'J:/javej/drought/drought_et/dmi_interpolated/temp_dry_2023-05-02.tif', descriptions=times)
@@ -0,0 +1,153 @@
+import os
+import re
+import mmap
+import numpy as np
+
+from tools.dmi_tools.dmi_records import DMIRecords
+
+
+class DMIOffsetIndex:
+    """
+    Byte offset index for random access into uncompressed DMI climate grid day files.
+
+    The index maps (parameterId, cellId) to the byte offset and length of the matching lines
+    and is built in one streaming pass over the file. It is saved next to the day file as
+    YYYY-MM-DD.txt.idx.npz and rebuilt when the size or modification time of the day file changes.
+    Records are then read through mmap, so a lookup only decodes the lines it returns.
+
+    Parameters:
+     - dmi_file (str path): uncompressed DMI climate grid file
+     - save (bool, optional): save the index next to the day file when it is built. Defaults to True
+    """
+
+    cell_id_pattern = re.compile(rb'"cellId"\s*:\s*"([^"]*)"')
+    parameter_id_pattern = re.compile(rb'"parameterId"\s*:\s*"([^"]*)"')
+
+
+    def __init__(self, dmi_file, save = True):
+        if not dmi_file.endswith('.txt'):
+            raise ValueError(f"Offset indices need uncompressed .txt files, got {dmi_file}")
+
+        self.dmi_file = dmi_file
+        self.index_path = dmi_file + '.idx.npz'
+
+        if not self.load():
+            self.build()
+            if save: self.save()
+
+        self.lookup = {}
+        for i, key in enumerate(zip(self.parameter_ids, self.cell_ids)):
+            self.lookup.setdefault(key, []).append(i)
+
+
+    def get_source_stats(self):
+        stats = os.stat(self.dmi_file)
+        return np.array([stats.st_size, stats.st_mtime_ns], dtype=np.int64)
+
+
+    def build(self):
+        """
+        Reads the day file once and records the offset and length of every line
+        """
+        parameter_ids, cell_ids, offsets, lengths = [], [], [], []
+
+        offset = 0
+        with open(self.dmi_file, 'rb') as file:
+            for line in file:
+                length = len(line.rstrip())
+                if length:
+                    parameter_id = self.parameter_id_pattern.search(line)
+                    cell_id = self.cell_id_pattern.search(line)
+
+                    if parameter_id is None or cell_id is None:
+                        record = DMIRecords.parse(line)
+                        parameter_id, cell_id = record.parameter_id, record.cell_id
+                    else:
+                        parameter_id, cell_id = parameter_id.group(1).decode('utf-8'), cell_id.group(1).decode('utf-8')
+
+                    parameter_ids.append(parameter_id)
+                    cell_ids.append(cell_id)
+                    offsets.append(offset)
+                    lengths.append(length)
+
+                offset += len(line)
+
+        self.parameter_ids = np.array(parameter_ids, dtype=str)
+        self.cell_ids = np.array(cell_ids, dtype=str)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.source_stats = self.get_source_stats()
+
+
+    def save(self):
+        np.savez(
+            self.index_path,
+            parameter_ids = self.parameter_ids,
+            cell_ids = self.cell_ids,
+            offsets = self.offsets,
+            lengths = self.lengths,
+            source_stats = self.source_stats
+        )
+
+
+    def load(self):
+        """
+        Loads the saved index if it is up to date with the day file
+        Returns True if the index was loaded
+        """
+        if not os.path.exists(self.index_path):
+            return False
+
+        with np.load(self.index_path) as index:
+            if not np.array_equal(index['source_stats'], self.get_source_stats()):
+                return False
+
+            self.parameter_ids = index['parameter_ids']
+            self.cell_ids = index['cell_ids']
+            self.offsets = index['offsets']
+            self.lengths = index['lengths']
+            self.source_stats = index['source_stats']
+
+        return True
+
+
+    def keys(self):
+        """
+        Returns the (parameterId, cellId) pairs in the day file
+        """
+        return list(self.lookup)
+
+
+    def get_records(self, keys):
+        """
+        Reads the records of the given (parameterId, cellId) pairs through mmap
+
+        Parameters:
+        - keys (list of tuple): (parameterId, cellId) pairs
+
+        Returns:
+        - dict of (parameterId, cellId) -> list of DMIRecord, pairs not in the file are left out
+        """
+        records = {}
+        if os.path.getsize(self.dmi_file) == 0:
+            return records
+
+        with open(self.dmi_file, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for key in keys:
+                lines = self.lookup.get(key)
+                if lines is None: continue
+
+                records[key] = [
+                    DMIRecords.parse(mapped[self.offsets[i]:self.offsets[i] + self.lengths[i]])
+                    for i in lines
+                ]
+
+        return records
+
+
+    def get_value(self, param, cell):
+        """
+        Returns the value of a parameter and cell, None if there is none.
+        Of several revisions the latest is used, see DMIRecords.revision_value
+        """
+        return DMIRecords.revision_value(self.get_records([(param, cell)]).get((param, cell), []))
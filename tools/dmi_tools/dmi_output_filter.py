@@ -1,8 +1,17 @@
 import glob
 import sys
 import os
+import time
+import shutil
 import json
-from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from tools.dmi_tools.dmi_files import DMIFiles
+from tools.dmi_tools.dmi_records import DMIRecords
+from tools.dmi_tools.dmi_store import DMIStore
+
+FileParseResult = namedtuple('FileParseResult', ['file', 'lines_read', 'lines_kept', 'seconds', 'lines_superseded', 'file_stats'], defaults = [0, None])
 
 class dmi_climate_data_parser:
 
@@ -80,39 +89,394 @@ class dmi_climate_data_parser:
             - type (str): The type of the geometry. Typically, "Polygon".
               Example: "Polygon"
 
+    - partition_by (tuple of str, optional): If None, one filtered text file is written per input day.
+      Otherwise the output directory is a DMIStore partitioned by these keys, 
+      e.g. ('parameterId', 'year', 'month') or ('cellId', 'year') for site-centric use
+
+    - deduplicate (str, optional): If given, only one revision of each (cellId, parameterId, from, to) is kept per file.
+      'latest' keeps the most recently created revision, 'qc' the one with the best qcStatus. See DMIRecords.deduplicate
+
     Returns:
     - filtered_json_strings (list of str): List of filtered JSON strings that match all the specified criteria.
     """
 
-    def __init__(self, climate_data_dir, output_dir, **kwargs):
+    def __init__(self, climate_data_dir, output_dir, partition_by = None, deduplicate = None, **kwargs):
 
-        self.climate_data_files = glob.glob(climate_data_dir + '*.txt')
+        if deduplicate not in ('latest', 'qc', None):
+            raise ValueError(f"deduplicate must be 'latest', 'qc' or None, got {deduplicate}")
+
+        self.climate_data_files = DMIFiles.list_files(climate_data_dir)
         self.output_dir = output_dir
+        self.partition_by = partition_by
+        self.deduplicate = deduplicate
 
         self.criteria = {k: v for k, v in kwargs.items() if v is not None}
+        self.prefilters = self.build_prefilters()
 
 
     # def parse_files(self):
     #     return [self.file_parser(cf) for cf in self.climate_data_files]
 
-    def parse_files(self):
-      with ThreadPoolExecutor(max_workers=10) as executor:
-          results = list(executor.map(self.file_parser, self.climate_data_files))
-      return results
+    def parse_files(self, processes = None, chunk_size = 256 * 1024 ** 2, incremental = False):
+        """
+        Filters all climate data files into the output directory.
 
+        Parameters:
+        - processes (int, optional): Number of worker processes. If None, files are filtered in a thread pool.
+          If 0, one process per CPU is used. Process workers sidestep the GIL, which serialises the JSON parsing in threads
+        - chunk_size (int, optional): In process mode, uncompressed files larger than this many bytes are split into
+          line aligned chunks that are filtered in parallel and joined afterwards. Defaults to 256 MB
+        - incremental (bool, optional): Only filter files that are new or have changed size or modification time
+          since the last run. Everything is filtered again if the criteria or layout have changed, and a store
+          with other partition keys is rebuilt. Defaults to False.
+          Outputs of climate files filtered in an earlier run that no longer exist are removed either way
 
-    def file_parser(self, climate_file):
-        with open(climate_file) as file: lines = [line.rstrip() for line in file]
+        Returns:
+        - results (list of FileParseResult): lines read, lines kept, seconds spent and superseded revisions dropped per file
+        """
+
+        state = self.load_state()
+
+        # A store built with other partition keys is built again. The partition keys are part of the settings,
+        # so every climate file is filtered again in that case, also in incremental runs
+        if self.partition_by is not None:
+            stored_partition_by = DMIStore.stored_partition_by(self.output_dir)
+            if stored_partition_by is not None and not stored_partition_by == list(self.partition_by):
+                DMIStore.remove_store(self.output_dir)
+
+        self.remove_outputs(self.get_removed_files(state))
+
+        climate_files = self.climate_data_files
+        if incremental:
+            climate_files = self.get_changed_files(state)
+
+        if self.partition_by is not None:
+            results = self.parse_partitioned(climate_files, processes)
+        elif processes is None:
+            with ThreadPoolExecutor(max_workers=10) as executor:
+                results = list(executor.map(self.file_parser, climate_files))
+        else:
+            results = self.parse_chunked(climate_files, processes, chunk_size)
+
+        self.save_state(state, results)
+        return results
+
+
+    def parse_chunked(self, climate_files, processes, chunk_size):
+        """
+        Filters climate files in a process pool, splitting large files into line aligned chunks
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        tasks = []
+        part_paths = {}
+        for climate_file in climate_files:
+            output_path = self.get_output_path(climate_file)
+            chunks = self.split_file(climate_file, chunk_size)
+
+            # Chunk outputs left by an aborted run must not end up in the output
+            for stale_path in glob.glob(glob.escape(output_path) + '.part*'):
+                os.remove(stale_path)
+
+            if len(chunks) == 1:
+                tasks.append((climate_file, 0, None, output_path))
+                continue
+
+            part_paths[climate_file] = [f'{output_path}.part{i}' for i in range(len(chunks))]
+            for (start, end), part_path in zip(chunks, part_paths[climate_file]):
+                tasks.append((climate_file, start, end, part_path))
+
+        with ProcessPoolExecutor(max_workers=processes or None) as executor:
+            chunk_results = list(executor.map(self.range_parser, *zip(*tasks))) if tasks else []
+
+        results = {}
+        for (climate_file, _, end, part_path), result in zip(tasks, chunk_results):
+            if climate_file in results:
+                previous = results[climate_file]
+                result = FileParseResult(
+                    climate_file,
+                    previous.lines_read + result.lines_read,
+                    previous.lines_kept + result.lines_kept,
+                    previous.seconds + result.seconds,
+                    previous.lines_superseded + result.lines_superseded,
+                    previous.file_stats
+                    )
+            results[climate_file] = result
+
+        for climate_file, paths in part_paths.items():
+            self.join_parts(climate_file, paths)
+
+        return list(results.values())
+
+
+    def parse_partitioned(self, climate_files, processes = None):
+        """
+        Filters climate data files into a partitioned DMIStore in the output directory.
+        Each file is filtered into a staging file in parallel, after which the staging files are merged into the partitions.
+        """
+        store = DMIStore(self.output_dir, self.partition_by)
+
+        if processes is None:
+            executor = ThreadPoolExecutor(max_workers=10)
+        else:
+            executor = ProcessPoolExecutor(max_workers=processes or None)
+
+        with executor:
+            results = list(executor.map(self.partition_parser, climate_files))
+
+        store.compact([store.staging_path(DMIFiles.strip_extension(climate_file)) for climate_file in climate_files])
+        return results
+
+
+    def get_state_path(self):
+        return os.path.join(self.output_dir, '_parser_state.json')
+
+
+    def get_settings(self):
+        """
+        Returns the filter criteria and output layout as a comparable JSON string
+        """
+        settings = {
+            'criteria': self.criteria,
+            'partition_by': None if self.partition_by is None else list(self.partition_by),
+            'deduplicate': self.deduplicate
+        }
+        return json.dumps(settings, sort_keys=True, default=str)
+
+
+    def get_file_stats(self, climate_file):
+        stats = os.stat(climate_file)
+        return {'size': stats.st_size, 'mtime': stats.st_mtime_ns}
+
+
+    def load_state(self):
+        """
+        Returns the state of the last run in the output directory, None if there is none
+        """
+        if not os.path.exists(self.get_state_path()):
+            return None
+
+        with open(self.get_state_path(), 'r') as file:
+            return json.load(file)
+
+
+    def save_state(self, state, results):
+        """
+        Records the filter settings and the size and modification time of each filtered climate file.
+        The file stats are taken when a file is opened for filtering, so a file changed during the run is filtered again
+        on the next incremental run. Climate files that no longer exist are dropped from the state.
+
+        Parameters:
+        - state (dict): the state loaded at the start of the run, or None
+        - results (list of FileParseResult): results of the files filtered in this run
+        """
+        if state is None or not state['settings'] == self.get_settings():
+            state = {'settings': self.get_settings(), 'files': {}}
+
+        current = {os.path.abspath(climate_file) for climate_file in self.climate_data_files}
+        state['files'] = {path: stats for path, stats in state['files'].items() if path in current}
+
+        for result in results:
+            state['files'][os.path.abspath(result.file)] = result.file_stats
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(self.get_state_path(), 'w') as file:
+            json.dump(state, file, indent=1)
+
+
+    def get_removed_files(self, state):
+        """
+        Returns the climate files filtered in an earlier run which no longer exist
+        """
+        if state is None:
+            return []
+
+        current = {os.path.abspath(climate_file) for climate_file in self.climate_data_files}
+        return [path for path in state['files'] if path not in current]
 
-        filtered_data = [self.json_parser(json_string) for json_string in lines if self.json_parser(json_string) is not None]
 
+    def remove_outputs(self, removed_files):
+        """
+        Removes the filtered output of climate files which no longer exist.
+        Days which are still covered by another climate file, e.g. a compressed copy, are kept.
+        """
+        current_days = {DMIFiles.strip_extension(climate_file) for climate_file in self.climate_data_files}
+        removed_days = sorted({DMIFiles.strip_extension(path) for path in removed_files} - current_days)
+        if not removed_days:
+            return
+
+        if self.partition_by is not None:
+            DMIStore(self.output_dir, self.partition_by).remove_dates(removed_days)
+            return
+
+        for day in removed_days:
+            output_path = os.path.join(self.output_dir, day + '.txt')
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+
+    def get_changed_files(self, state):
+        """
+        Returns the climate data files which are new or changed since the state was saved.
+        Returns all files if there is no state or the filter settings have changed.
+        """
+        if state is None or not state['settings'] == self.get_settings():
+            return self.climate_data_files
+
+        return [
+            climate_file for climate_file in self.climate_data_files
+            if not state['files'].get(os.path.abspath(climate_file)) == self.get_file_stats(climate_file)
+        ]
+
+
+    def partition_parser(self, climate_file):
+        """
+        Filters a climate file into a DMIStore staging file
+
+        Returns:
+        - FileParseResult
+        """
+        t = time.time()
+        file_stats = self.get_file_stats(climate_file)
+        store = DMIStore(self.output_dir, self.partition_by)
+
+        records = []
+        lines_read = 0
+        for line in DMIFiles.iter_lines(climate_file):
+            lines_read += 1
+            if not self.prefilter(line): continue
+
+            data = DMIRecords.loads(line)
+            if self.matches(data):
+                records.append(DMIRecords.from_feature(data))
+
+        superseded = 0
+        if self.deduplicate is not None:
+            records, superseded = DMIRecords.deduplicate(records, self.deduplicate)
+
+        store.write_staging(records, DMIFiles.strip_extension(climate_file))
+        return FileParseResult(climate_file, lines_read, len(records), time.time() - t, superseded, file_stats)
+
+
+    def split_file(self, climate_file, chunk_size):
+        """
+        Splits a file into byte ranges of roughly chunk_size.
+        The ranges are aligned to lines by range_parser when read.
+        Compressed files cannot be read from an offset and are never split, 
+        and neither are files that are deduplicated, as revisions can be spread across the file.
+
+        Returns:
+        - list of (start, end) byte offsets
+        """
+        file_size = os.path.getsize(climate_file)
+        if not chunk_size or file_size <= chunk_size or not climate_file.endswith('.txt') or self.deduplicate is not None:
+            return [(0, None)]
+
+        return [(start, min(start + chunk_size, file_size)) for start in range(0, file_size, chunk_size)]
+
+
+    def join_parts(self, climate_file, part_paths):
+        """
+        Joins the chunk outputs of a split climate file into its output file, in the order of part_paths
+        """
+        output_path = self.get_output_path(climate_file)
+        with open(output_path, 'wb') as output_file:
+            for part_path in part_paths:
+                with open(part_path, 'rb') as part_file:
+                    shutil.copyfileobj(part_file, output_file)
+                os.remove(part_path)
+
+
+    def get_output_path(self, climate_file):
+        """
+        Returns the path of the filtered output of a climate file. Outputs are always uncompressed .txt files
+        """
+        return os.path.join(self.output_dir, DMIFiles.strip_extension(climate_file) + '.txt')
+
+
+    def file_parser(self, climate_file):
         os.makedirs(self.output_dir, exist_ok=True)
-        filename = os.path.basename(climate_file)
-        output_path = os.path.join(self.output_dir, filename)
+        return self.range_parser(climate_file, 0, None, self.get_output_path(climate_file))
+
+
+    def range_parser(self, climate_file, start, end, output_path):
+        """
+        Filters the lines of climate_file starting within the byte range [start, end) into output_path.
+        If end is None, the file is read to the end. The file is streamed, so memory use does not depend on its size.
+
+        Returns:
+        - FileParseResult
+        """
+        t = time.time()
+        file_stats = self.get_file_stats(climate_file)
+        lines_read = 0
+        lines_kept = 0
+        superseded = 0
+        revisions = {}
 
-        with open(output_path, 'w') as file:
-            for json_str in filtered_data:
-                file.write(json_str + '\n')
+        with DMIFiles.open(climate_file) as file, open(output_path, 'wb') as output_file:
+            if start > 0:
+                file.seek(start - 1)
+                file.readline()
+            position = file.tell()
+
+            for line in file:
+                if end is not None and position >= end: break
+                position += len(line)
+
+                line = line.rstrip()
+                if not line: continue
+                lines_read += 1
+                if not self.prefilter(line): continue
+
+                data = DMIRecords.loads(line)
+                if not self.matches(data): continue
+
+                if self.deduplicate is None:
+                    output_file.write(line + b'\n')
+                    lines_kept += 1
+                    continue
+
+                record = DMIRecords.from_feature(data)
+                key = DMIRecords.revision_key(record)
+                if key in revisions:
+                    superseded += 1
+                    if not DMIRecords.is_newer_revision(record, revisions[key][0], self.deduplicate): continue
+                revisions[key] = (record, line)
+
+            for _, line in revisions.values():
+                output_file.write(line + b'\n')
+                lines_kept += 1
+
+        return FileParseResult(climate_file, lines_read, lines_kept, time.time() - t, superseded, file_stats)
+
+
+    def build_prefilters(self):
+        """
+        Builds byte patterns for the string criteria on parameterId and cellId, used to skip lines before decoding them.
+        On large grids, such as the 1 km grid, most lines are dropped this way without being parsed.
+
+        Returns:
+        - list of (key, values): key and allowed values as quoted bytes, e.g. (b'"parameterId"', [b'"mean_temp"'])
+        """
+        prefilters = []
+        for key in ('parameterId', 'cellId'):
+            values = self.criteria.get(key)
+            if not values or not all(isinstance(value, str) for value in values): continue
+            prefilters.append((f'"{key}"'.encode('utf-8'), [f'"{value}"'.encode('utf-8') for value in values]))
+
+        return prefilters
+
+
+    def prefilter(self, line):
+        """
+        Checks a raw line against the prefilters. Returns False only for lines that cannot match the criteria.
+        Lines where the key is missing are kept, as matches() does not filter on missing properties.
+        """
+        for key, values in self.prefilters:
+            if key in line and not any(value in line for value in values):
+                return False
+        return True
 
 
     def json_parser(self, json_str):
@@ -123,18 +487,22 @@ class dmi_climate_data_parser:
         - json_strings (list): List of JSON strings to filter.
         """
         
-        data = json.loads(json_str)
+        if self.matches(DMIRecords.loads(json_str)):
+            return json_str
+
+
+    def matches(self, data):
+        """
+        Checks a decoded JSON object against the initialized criteria.
+        """
         properties = data.get("properties", {})
         
-        match = True
         for key, allowed_values in self.criteria.items():
             if properties.get(key) is None: continue
             if properties.get(key) not in allowed_values:
-                match = False
-                break
+                return False
 
-        if match:
-            return json_str
+        return True
 
 if __name__ == "__main__":
     climate_data_dir = "J:/javej/drought/drought_et/dmi_climate_grid/raw_files/"
@@ -145,6 +513,6 @@ if __name__ == "__main__":
 
 
     parser = dmi_climate_data_parser(climate_data_dir, output_dir, parameterId = parameterId, cellId = cellId)
-    filtered_climate_data = parser.parse_files()
+    filtered_climate_data = parser.parse_files(processes = 0, incremental = True)
 
-    print(len(filtered_climate_data))
+    print(f'{len(filtered_climate_data)} files, {sum(result.lines_kept for result in filtered_climate_data)} lines kept')
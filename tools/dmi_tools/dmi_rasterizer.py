@@ -26,14 +26,17 @@ class ETRasterBuilder:
     Tools for making and localizing ET data
 
     Parameters:
-     - et_files (list): list of geotiffs of evaporative fraction (ETF)
+     - et_files (list or str path): list of geotiffs of evaporative fraction (ETF), or a directory to search for them
      - output_dir (str path): path to output directory
      - dmi_data_dir (str path): path to directory with DMI climate grid files
      - dmi_param (str, optional): parameter in DMI climate data to apply to ETF data. Defaults to "pot_evaporation_makkink"
-     - crs (crs str, optional): crs of output rasters. Defaults to EPSG:4326
     """
 
-    def __init__(self, output_dir, dmi_data_dir, dmi_param = "pot_evaporation_makkink"):
+    def __init__(self, et_files, output_dir, dmi_data_dir, dmi_param = "pot_evaporation_makkink"):
+        if type(et_files) == list:
+            self.et_files = et_files
+        elif type(et_files) == str:
+            self.et_files = glob.glob(et_files + '/**/*_ETF.tif')
 
         self.output_dir = output_dir
         if not os.path.exists(self.output_dir):
@@ -56,12 +59,10 @@ class ETRasterBuilder:
                 self.dmi_param
             )
 
-            for j, dmi_json in enumerate(param_filtered_data):
-                t2 = time.time()
-                rastertools.overwrite_geotiff_within_bbox(dmi_json)
+            t2 = time.time()
+            rastertools.rasterize_records(param_filtered_data)
 
-                print(f'Raster {i} / {len(self.et_files)}; Tile {j} / {len(param_filtered_data)}, t = {time.time() - t2}', end = '\r')
-                # print(f'{i} / {len(overlapping_data)}')
+            print(f'Raster {i} / {len(self.et_files)}; Tiles {len(param_filtered_data)}, t = {time.time() - t2}', end = '\r')
 
             # rastertools.constrict_dynamic_range((0, 10))
             # rastertools.smooth_nodata_pixels()
@@ -76,11 +77,12 @@ if __name__ == '__main__':
     
     dmi_data_dir = "J:/javej/drought/drought_et/dmi_climate_grid/sorted_et_files/"
 
+    et_dir = 'J:/javej/drought/drought_et/SSEB_files/gludsted'
     dmi_raster_output = "test_files/PET/"
     crs = 'EPSG_4326'
 
 
-    ETRasterBuilder(dmi_raster_output, dmi_data_dir).build_dmi_data_raster()
+    ETRasterBuilder(et_dir, dmi_raster_output, dmi_data_dir).build_dmi_data_raster()
 
 
 
@@ -0,0 +1,217 @@
+from collections import namedtuple
+import json
+from datetime import datetime, timezone
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from tools.dmi_tools.dmi_files import DMIFiles
+
+
+DMIRecord = namedtuple('DMIRecord', [
+    'cell_id',
+    'parameter_id',
+    'value',
+    'bbox',
+    'time_from',
+    'time_to',
+    'created',
+    'qc_status',
+    'time_resolution',
+    'id',
+    'calculated_at',
+], defaults = [None])
+
+
+class DMIRecords:
+    """
+    Tools for parsing lines of DMI climate grid files into DMIRecord tuples.
+
+    Each line is parsed once into a DMIRecord which is passed on as is, instead of
+    being turned back into a JSON string and parsed again downstream.
+    orjson is used for decoding when it is installed.
+    """
+
+    def loads(json_str):
+        """
+        Decodes a JSON string, using orjson if available
+        """
+        if orjson is not None:
+            return orjson.loads(json_str)
+        return json.loads(json_str)
+
+
+    def dumps(data):
+        """
+        Encodes an object as a compact JSON string, using orjson if available
+        """
+        if orjson is not None:
+            return orjson.dumps(data).decode('utf-8')
+        return json.dumps(data, separators=(',', ':'))
+
+
+    def from_feature(feature):
+        """
+        Takes a decoded GeoJSON feature from a DMI climate grid file
+        Returns a DMIRecord
+        """
+        properties = feature['properties']
+        return DMIRecord(
+            cell_id = properties.get('cellId'),
+            parameter_id = properties.get('parameterId'),
+            value = properties.get('value'),
+            bbox = feature['geometry']['coordinates'],
+            time_from = properties.get('from'),
+            time_to = properties.get('to'),
+            created = properties.get('created'),
+            qc_status = properties.get('qcStatus'),
+            time_resolution = properties.get('timeResolution'),
+            id = feature.get('id'),
+            calculated_at = properties.get('calculatedAt'),
+        )
+
+
+    def parse(json_str):
+        """
+        Takes a line from a DMI climate grid file
+        Returns a DMIRecord
+        """
+        return DMIRecords.from_feature(DMIRecords.loads(json_str))
+
+
+    def iter_records(dmi_file, params = None, cells = None):
+        """
+        Streams the DMIRecords of a DMI climate grid file, filtering while reading.
+        Reads .txt, .txt.gz and .txt.zst files.
+
+        Parameters:
+        - dmi_file (str): path to a DMI climate grid file
+        - params (list of str, optional): only yield records with these parameterIds
+        - cells (list of str, optional): only yield records with these cellIds
+        """
+        if params is not None: params = set(params)
+        if cells is not None: cells = set(cells)
+
+        for line in DMIFiles.iter_lines(dmi_file, contains = params):
+            record = DMIRecords.parse(line)
+
+            if params is not None and not record.parameter_id in params: continue
+            if cells is not None and not record.cell_id in cells: continue
+
+            yield record
+
+
+    qc_ranks = {'manual': 2, 'automatic': 1, 'none': 0}
+
+
+    def revision_key(record):
+        """
+        Returns the key identifying revisions of the same value: (cellId, parameterId, from, to)
+        """
+        return (record.cell_id, record.parameter_id, record.time_from, record.time_to)
+
+
+    def is_newer_revision(record, other, prefer = 'latest'):
+        """
+        Checks if record supersedes other, an earlier seen revision of the same value.
+
+        Parameters:
+        - prefer (str): 'latest' keeps the most recently created revision,
+          'qc' keeps the revision with the best qcStatus and the latest of those
+        """
+        def created(record):
+            if record.created is None:
+                return datetime.min.replace(tzinfo=timezone.utc)
+            time = datetime.fromisoformat(record.created)
+            if time.tzinfo is None:
+                time = time.replace(tzinfo=timezone.utc)
+            return time
+
+        if prefer == 'qc':
+            rank = DMIRecords.qc_ranks.get(record.qc_status, -1)
+            other_rank = DMIRecords.qc_ranks.get(other.qc_status, -1)
+            if not rank == other_rank:
+                return rank > other_rank
+        elif not prefer == 'latest':
+            raise ValueError(f"prefer must be 'latest' or 'qc', got {prefer}")
+
+        return created(record) > created(other)
+
+
+    def deduplicate(records, prefer = 'latest'):
+        """
+        Keeps one revision per (cellId, parameterId, from, to) in one pass over the records.
+        DMI republishes values after QC, so a download can hold several revisions of the same value.
+
+        Parameters:
+        - records (iterable of DMIRecord)
+        - prefer (str, optional): 'latest' keeps the most recently created revision,
+          'qc' keeps the revision with the best qcStatus (manual > automatic > none). Defaults to 'latest'
+
+        Returns:
+        - records (list of DMIRecord): the kept revisions, in order of first appearance
+        - superseded (int): number of records dropped
+        """
+        kept = {}
+        superseded = 0
+        for record in records:
+            key = DMIRecords.revision_key(record)
+            if key in kept:
+                superseded += 1
+                if not DMIRecords.is_newer_revision(record, kept[key], prefer):
+                    continue
+            kept[key] = record
+
+        return list(kept.values()), superseded
+
+
+    def revision_value(records, prefer = 'latest'):
+        """
+        Returns the value of one parameter and cell from all its records in a file, with the revision rule of deduplicate.
+        If the records cover several periods, the value of the last period is returned. None if there are no records
+        """
+        records, _ = DMIRecords.deduplicate(records, prefer)
+        if not records:
+            return None
+        return records[-1].value
+
+
+    def to_feature(record):
+        """
+        Takes a DMIRecord
+        Returns a GeoJSON feature in the layout of the DMI climate grid files.
+        calculatedAt is only written when the record has it, records built by DMIAggregator or DMIStore do not
+        """
+        properties = {}
+        if record.calculated_at is not None:
+            properties['calculatedAt'] = record.calculated_at
+
+        return {
+            'geometry': {
+                'coordinates': record.bbox,
+                'type': 'Polygon'
+            },
+            'properties': {
+                **properties,
+                'cellId': record.cell_id,
+                'created': record.created,
+                'from': record.time_from,
+                'parameterId': record.parameter_id,
+                'qcStatus': record.qc_status,
+                'timeResolution': record.time_resolution,
+                'to': record.time_to,
+                'value': record.value
+            },
+            'type': 'Feature',
+            'id': record.id
+        }
+
+
+    def to_json(record):
+        """
+        Takes a DMIRecord
+        Returns a line for a DMI climate grid file
+        """
+        return DMIRecords.dumps(DMIRecords.to_feature(record))
@@ -0,0 +1,387 @@
+import os
+import glob
+import json
+from collections import defaultdict
+from datetime import datetime, timezone
+import numpy as np
+
+from tools.dmi_tools.dmi_records import DMIRecord
+
+
+class DMIStore:
+    """
+    Partitioned, columnar store for filtered DMI climate grid data.
+
+    Data is kept in compressed .npz files, one per partition, in hive style directories such as
+    pot_evaporation_makkink/2023/05 -> 'parameterId=pot_evaporation_makkink/year=2023/month=05/part.npz'.
+    A small JSON index in the store directory lists the partitions with their keys, row counts and dates,
+    so a query like "all makkink PET for May 2023" only opens the partitions it needs.
+
+    Partitions are built in two steps. Each day file is first written to its own staging file,
+    which can be done in parallel, and compact() then merges the staging files into the partitions
+    one year or month at a time. Rows from days that are already in the store are replaced.
+
+    Parameters:
+     - store_dir (str path): directory of the store
+     - partition_by (tuple of str, optional): keys to partition by, from parameterId, cellId, year and month.
+       Defaults to ('parameterId', 'year', 'month'). Use ('cellId', 'year') for site-centric use.
+       An existing store can only be opened with the keys it was built with. To change them, remove it
+       with DMIStore.remove_store and build it again, dmi_climate_data_parser does this when its partition_by changes
+    """
+
+    columns = ('date', 'cell_id', 'parameter_id', 'time_from', 'time_to', 'created', 'qc_status', 'value')
+    partition_keys = {'parameterId': 'parameter_id', 'cellId': 'cell_id', 'year': None, 'month': None}
+    index_name = '_index.json'
+    staging_dir_name = '_staging'
+
+
+    def __init__(self, store_dir, partition_by = ('parameterId', 'year', 'month')):
+        self.store_dir = store_dir
+        self.index_path = os.path.join(store_dir, self.index_name)
+        self.staging_dir = os.path.join(store_dir, self.staging_dir_name)
+
+        for key in partition_by:
+            if key not in self.partition_keys:
+                raise ValueError(f"Cannot partition by '{key}'. Options are: {', '.join(self.partition_keys)}")
+
+        self.index = {'partition_by': list(partition_by), 'partitions': {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as file:
+                self.index = json.load(file)
+
+            if not self.index['partition_by'] == list(partition_by):
+                raise ValueError(f"{store_dir} is partitioned by {self.index['partition_by']}, not {list(partition_by)}")
+
+        self.partition_by = tuple(partition_by)
+        self.time_keys = tuple(key for key in self.partition_by if key in ('year', 'month'))
+
+
+    @staticmethod
+    def stored_partition_by(store_dir):
+        """
+        Returns the partition keys of the store in store_dir as a list, None if there is no store
+        """
+        index_path = os.path.join(store_dir, DMIStore.index_name)
+        if not os.path.exists(index_path):
+            return None
+
+        with open(index_path, 'r') as file:
+            return json.load(file)['partition_by']
+
+
+    @staticmethod
+    def remove_store(store_dir):
+        """
+        Removes the partitions, staging files and index of the store in store_dir.
+        Other files in the directory are left alone.
+        """
+        index_path = os.path.join(store_dir, DMIStore.index_name)
+        if os.path.exists(index_path):
+            with open(index_path, 'r') as file:
+                partitions = json.load(file)['partitions']
+
+            for path in partitions:
+                partition_path = os.path.join(store_dir, path)
+                if os.path.exists(partition_path):
+                    os.remove(partition_path)
+
+                # Remove the hive style directories of the partition once they are empty
+                directory = os.path.dirname(path)
+                while directory and not os.listdir(os.path.join(store_dir, directory)):
+                    os.rmdir(os.path.join(store_dir, directory))
+                    directory = os.path.dirname(directory)
+
+            os.remove(index_path)
+
+        for staging_file in glob.glob(os.path.join(store_dir, DMIStore.staging_dir_name, '*.npz')):
+            os.remove(staging_file)
+
+
+    @staticmethod
+    def records_to_columns(records, date):
+        """
+        Converts DMIRecords from the day file of date into a dict of typed column arrays
+
+        Parameters:
+        - records (list of DMIRecord): records of one day file
+        - date (str): date of the day file, YYYY-MM-DD
+        """
+        return {
+            'date': np.full(len(records), np.datetime64(date, 'D')),
+            'cell_id': np.array([record.cell_id for record in records], dtype=str),
+            'parameter_id': np.array([record.parameter_id for record in records], dtype=str),
+            'time_from': DMIStore.to_datetime64([record.time_from for record in records]),
+            'time_to': DMIStore.to_datetime64([record.time_to for record in records]),
+            'created': DMIStore.to_datetime64([record.created for record in records]),
+            'qc_status': np.array([record.qc_status or '' for record in records], dtype=str),
+            'value': np.array([np.nan if record.value is None else record.value for record in records], dtype=np.float64),
+        }
+
+
+    @staticmethod
+    def columns_to_records(columns):
+        """
+        Converts a dict of column arrays back into DMIRecords.
+        Geometries are not stored and can be recreated from the cellIds with DMIGrid.
+        """
+        def to_iso(timestamps):
+            return [None if np.isnat(time) else str(time) + '+00:00' for time in timestamps]
+
+        time_from = to_iso(columns['time_from'])
+        time_to = to_iso(columns['time_to'])
+        created = to_iso(columns['created'])
+
+        return [
+            DMIRecord(
+                cell_id = str(columns['cell_id'][i]),
+                parameter_id = str(columns['parameter_id'][i]),
+                value = float(columns['value'][i]),
+                bbox = None,
+                time_from = time_from[i],
+                time_to = time_to[i],
+                created = created[i],
+                qc_status = str(columns['qc_status'][i]) or None,
+                time_resolution = None,
+                id = None,
+            )
+            for i in range(len(columns['value']))
+        ]
+
+
+    @staticmethod
+    def to_datetime64(timestamps):
+        """
+        Converts ISO timestamps with UTC offsets to a naive UTC datetime64[us] array, NaT where missing.
+        A day file holds few distinct timestamps, so only the unique ones are parsed.
+        """
+        def to_utc(timestamp):
+            if not timestamp:
+                return 'NaT'
+            time = datetime.fromisoformat(timestamp)
+            if time.tzinfo is not None:
+                time = time.astimezone(timezone.utc).replace(tzinfo=None)
+            return time.isoformat()
+
+        if not len(timestamps):
+            return np.array([], dtype='datetime64[us]')
+
+        unique_timestamps, inverse = np.unique(np.array([timestamp or '' for timestamp in timestamps], dtype=str), return_inverse=True)
+        unique_times = np.array([to_utc(timestamp) for timestamp in unique_timestamps], dtype='datetime64[us]')
+        return unique_times[inverse.ravel()]
+
+
+    def write_staging(self, records, date):
+        """
+        Writes the DMIRecords of one day file to the staging area
+        Returns the path of the staging file
+        """
+        os.makedirs(self.staging_dir, exist_ok=True)
+        staging_path = self.staging_path(date)
+        np.savez_compressed(staging_path, **DMIStore.records_to_columns(records, date))
+        return staging_path
+
+
+    def staging_path(self, date):
+        return os.path.join(self.staging_dir, f'{date}.npz')
+
+
+    def compact(self, staging_files = None):
+        """
+        Merges staging files into the partitions and updates the index.
+        Staging files are grouped by the time keys of the partitioning, so only one group is held in memory.
+
+        Parameters:
+        - staging_files (list of str, optional): staging files to merge. Defaults to all files in the staging area
+        """
+        if staging_files is None:
+            staging_files = glob.glob(os.path.join(self.staging_dir, '*.npz'))
+
+        groups = defaultdict(list)
+        for staging_file in staging_files:
+            date = os.path.splitext(os.path.basename(staging_file))[0]
+            groups[self.time_partition(date)].append(staging_file)
+
+        for time_partition, group_files in sorted(groups.items()):
+            staged = [DMIStore.load(staging_file) for staging_file in group_files]
+            staged = DMIStore.concatenate(staged)
+            staged_dates = np.unique(staged['date'])
+
+            existing = [
+                DMIStore.load(os.path.join(self.store_dir, path))
+                for path, entry in self.index['partitions'].items()
+                if self.entry_time_partition(entry) == time_partition
+            ]
+            existing = [columns for columns in existing if len(columns['date'])]
+            existing = [DMIStore.select(columns, ~np.isin(columns['date'], staged_dates)) for columns in existing]
+
+            self.write_partitions(DMIStore.concatenate(existing + [staged]), time_partition)
+
+            for staging_file in group_files:
+                os.remove(staging_file)
+
+        self.save_index()
+
+
+    def remove_dates(self, dates):
+        """
+        Removes the rows of whole days from the partitions and updates the index
+
+        Parameters:
+        - dates (list of str): YYYY-MM-DD dates to remove
+        """
+        groups = defaultdict(list)
+        for date in dates:
+            groups[self.time_partition(date)].append(np.datetime64(date, 'D'))
+
+        for time_partition, group_dates in sorted(groups.items()):
+            existing = [
+                DMIStore.load(os.path.join(self.store_dir, path))
+                for path, entry in self.index['partitions'].items()
+                if self.entry_time_partition(entry) == time_partition
+            ]
+            existing = [DMIStore.select(columns, ~np.isin(columns['date'], group_dates)) for columns in existing]
+            self.write_partitions(DMIStore.concatenate(existing), time_partition)
+
+        self.save_index()
+
+
+    def write_partitions(self, columns, time_partition):
+        """
+        Splits the columns of one time partition by the other partition keys and writes one file per partition
+        """
+        replaced_paths = set()
+        for path, entry in list(self.index['partitions'].items()):
+            if self.entry_time_partition(entry) == time_partition:
+                replaced_paths.add(path)
+                del self.index['partitions'][path]
+
+        column_keys = [key for key in self.partition_by if self.partition_keys[key] is not None]
+        if column_keys:
+            key_columns = np.stack([columns[self.partition_keys[key]] for key in column_keys], axis=1)
+            unique_keys, inverse = np.unique(key_columns, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+        else:
+            unique_keys, inverse = [()], np.zeros(len(columns['date']), dtype=int)
+
+        for i, key_values in enumerate(unique_keys):
+            keys = dict(zip(column_keys, [str(value) for value in key_values]))
+            keys.update(dict(zip(self.time_keys, time_partition)))
+
+            partition = DMIStore.select(columns, inverse == i)
+            if not len(partition['date']): continue
+
+            order = np.lexsort((partition['cell_id'], partition['parameter_id'], partition['time_from'], partition['date']))
+            partition = DMIStore.select(partition, order)
+
+            path = self.partition_path(keys)
+            os.makedirs(os.path.join(self.store_dir, os.path.dirname(path)), exist_ok=True)
+            np.savez_compressed(os.path.join(self.store_dir, path), **partition)
+
+            self.index['partitions'][path] = {
+                'keys': keys,
+                'rows': int(len(partition['date'])),
+                'first_date': str(partition['date'].min()),
+                'last_date': str(partition['date'].max()),
+            }
+
+        for path in replaced_paths - set(self.index['partitions']):
+            os.remove(os.path.join(self.store_dir, path))
+
+
+    def time_partition(self, date):
+        """
+        Returns the values of the time keys for a date string. Example: (2023, 5)
+        """
+        date = datetime.strptime(date, '%Y-%m-%d')
+        return tuple(getattr(date, key) for key in self.time_keys)
+
+
+    def entry_time_partition(self, entry):
+        return tuple(entry['keys'][key] for key in self.time_keys)
+
+
+    def partition_path(self, keys):
+        """
+        Returns the path of a partition file relative to the store directory
+        """
+        parts = []
+        for key in self.partition_by:
+            value = f'{keys[key]:02d}' if key == 'month' else keys[key]
+            parts.append(f'{key}={value}')
+
+        return '/'.join(parts + ['part.npz'])
+
+
+    def save_index(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        with open(self.index_path, 'w') as file:
+            json.dump(self.index, file, indent=1, sort_keys=True)
+
+
+    def partitions(self, **keys):
+        """
+        Returns the paths of the partitions matching the given partition keys.
+        Each key takes a single value or a list of values. Example: partitions(parameterId = 'mean_temp', year = 2023)
+        """
+        def matches(entry):
+            for key, values in keys.items():
+                if key not in entry['keys']: continue
+                if not isinstance(values, (list, tuple, set)): values = [values]
+                if entry['keys'][key] not in values: return False
+            return True
+
+        return sorted(path for path, entry in self.index['partitions'].items() if matches(entry))
+
+
+    def read(self, **keys):
+        """
+        Reads the rows matching the given keys into a dict of column arrays.
+        Only the partitions matching the partition keys are opened, other keys (e.g. cellId when the store
+        is partitioned by parameter, or month when it is partitioned by year) are applied as row filters.
+        Example: read(parameterId = 'pot_evaporation_makkink', year = 2023, month = 5)
+        """
+        for key in keys:
+            if key not in self.partition_keys:
+                raise ValueError(f"Cannot read by '{key}'. Options are: {', '.join(self.partition_keys)}")
+
+        columns = DMIStore.concatenate([DMIStore.load(os.path.join(self.store_dir, path)) for path in self.partitions(**keys)])
+
+        for key, values in keys.items():
+            if key in self.partition_by: continue
+            if not isinstance(values, (list, tuple, set)): values = [values]
+
+            if key == 'year':
+                column = columns['date'].astype('datetime64[Y]').astype(int) + 1970
+            elif key == 'month':
+                column = columns['date'].astype('datetime64[M]').astype(int) % 12 + 1
+            else:
+                column = columns[self.partition_keys[key]]
+
+            columns = DMIStore.select(columns, np.isin(column, list(values)))
+
+        return columns
+
+
+    def read_records(self, **keys):
+        """
+        Reads the rows matching the given keys as DMIRecords. See read()
+        """
+        return DMIStore.columns_to_records(self.read(**keys))
+
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as data:
+            return {column: data[column] for column in DMIStore.columns}
+
+
+    @staticmethod
+    def select(columns, selection):
+        return {column: values[selection] for column, values in columns.items()}
+
+
+    @staticmethod
+    def concatenate(column_dicts):
+        if not column_dicts:
+            return DMIStore.records_to_columns([], '1970-01-01')
+        return {column: np.concatenate([columns[column] for columns in column_dicts]) for column in DMIStore.columns}
@@ -1,6 +1,7 @@
 from datetime import datetime
+from functools import lru_cache
 import os
-import json
+from shapely import STRtree
 from shapely.geometry import Polygon
 from shapely.geometry import box
 from shapely.geometry import shape
@@ -11,14 +12,22 @@ import numpy as np
 import rasterio as rio
 from rasterio import features
 from rasterio.transform import from_bounds
+from rasterio.warp import transform_bounds
 import sys
 
+from tools.dmi_tools.dmi_files import DMIFiles
+from tools.dmi_tools.dmi_grid import DMIGrid
+from tools.dmi_tools.dmi_records import DMIRecords
+
 
 class DMITools:
     def get_dmi_contents(dmi_file):
-        with open(dmi_file, 'r') as file:
-            lines = [line.rstrip() for line in file]
-        return lines
+        """
+        Streams the lines of a DMI climate grid file as strings.
+        Reads .txt, .txt.gz and .txt.zst files.
+        """
+        for line in DMIFiles.iter_lines(dmi_file):
+            yield line.decode('utf-8')
     
     def datetime_from_landsat(landsat_file):
         """
@@ -36,43 +45,38 @@ class DMITools:
     def file_from_datetime(date, dmi_dir):
         """
         Takes a datetime object and a directory containing DMI gridded climate data
-        and returns the file corresponding to the date
+        and returns the file corresponding to the date.
+        Compressed .txt.gz and .txt.zst files are used if no .txt file exists.
         """
 
-        return os.path.join(dmi_dir, date.strftime('%Y-%m-%d') + '.txt')
+        return DMIFiles.find_file(dmi_dir, date.strftime('%Y-%m-%d'))
     
     
-    def get_bbox(json_str):
+    def get_bbox(record):
         """
-        Takes json string from a DMI climate grid file
+        Takes a DMIRecord from a DMI climate grid file
         Returns bbox
         """
-        return json_str['geometry']['coordinates']
+        return record.bbox
     
 
-    def get_value(json_data):
+    def get_value(record):
         """
-        Takes a JSON object from a DMI climate grid file
+        Takes a DMIRecord from a DMI climate grid file
         Returns the 'value' parameter
         """
-        return json_data['properties']['value']
+        return record.value
     
 
     def get_overlapping_data(dmi_file, et_file, param):
         """
-        Takes a DMI climate grid file,  an open rasterio object and a parameter string corresponging to a DMI climate grid parameter.
-        Returns a list of the JSON strings which have overlapping bounds with the geotiff.
-        If no data overlaps, returns False.
-        """
+        Takes a DMI climate grid file, a geotiff path and a parameter string corresponging to a DMI climate grid parameter.
+        Returns a list of the DMIRecords which have overlapping bounds with the geotiff.
 
-        def process_line(line, raster_bounds, param):
-            if not param in line: return
+        DMI grid cells, at any resolution, are matched with index arithmetic on their cellIds in EPSG:25832,
+        other cells through a spatial index. The cells are cached so further scenes from the same date reuse them.
+        """
 
-            line = json.loads(line)
-            if DMITools.check_bbox_intersection(raster_bounds, line):
-                return str(line).replace("'", '"')
-                #string formatting required to return what would otherwise be a dict object to json readable string
-        
         def convert_src_bounds_to_4326(src):
             """
             Converts the bounds of the GeoTIFF (src) to EPSG:4326.
@@ -88,89 +92,101 @@ class DMITools:
             bbox_4326 = box(bounds.left, bounds.bottom, bounds.right, bounds.top)
             return Polygon([transformer.transform(x, y) for x, y in bbox_4326.exterior.coords])
 
-
-        with open(dmi_file, 'r') as file:
-               lines = [line.rstrip() for line in file]
+        records, grid_indices = DMITools.get_cell_records(dmi_file, param)
+        if not records:
+            return []
 
         with rio.open(et_file) as src:
-            raster_bounds = convert_src_bounds_to_4326(src)
+            if grid_indices is not None:
+                raster_bounds = transform_bounds(src.crs, DMIGrid.crs, *src.bounds, densify_pts=21)
+            else:
+                raster_bounds = convert_src_bounds_to_4326(src)
 
-        overlapping_data = []
-        for line in lines:
-            result = process_line(line, raster_bounds, param)
-            if not result == None: overlapping_data.append(result)
+        if grid_indices is not None:
+            overlapping = np.flatnonzero(DMIGrid.cells_in_bounds(grid_indices, raster_bounds))
+        else:
+            overlapping = np.sort(DMITools.get_cell_index(dmi_file, param)[0].query(raster_bounds, predicate='intersects'))
 
-        return overlapping_data
-    
+        return [records[i] for i in overlapping]
 
-    def get_parameter_specific_data(dmi_file, param):
-        """
-        Takes a DMI climate grid file,  an open rasterio object and a parameter string corresponging to a DMI climate grid parameter.
-        Returns a list of the JSON strings which have overlapping bounds with the geotiff.
-        If no data overlaps, returns False.
-        """
 
-        def check_param(line, param):
-            if not param in line: 
-                return False
-            
-            return True
-
-        with open(dmi_file, 'r') as file:
-               lines = [line.rstrip() for line in file]
+    def get_cell_records(dmi_file, param):
+        """
+        Reads the records of a parameter in a DMI climate grid file, with their decoded DMI grid cell indices.
+        Cached per file, parameter and file modification time.
 
-        param_data = []
-        for line in lines:
+        Returns:
+        - records (list of DMIRecord): records of the parameter
+        - grid_indices (tuple): (cell_size, northing_indices, easting_indices) as from DMIGrid.cell_ids_to_indices,
+          None if the cellIds are not DMI grid cellIds of a single cell size
+        """
+        return DMITools._cached_cell_records(dmi_file, param, os.path.getmtime(dmi_file))
 
-            if not check_param(line, param): continue
 
-            line = json.loads(line)
-            line = str(line).replace("'", '"')
+    @lru_cache(maxsize=16)
+    def _cached_cell_records(dmi_file, param, mtime):
+        records = list(DMIRecords.iter_records(dmi_file, params = [param]))
+        try:
+            grid_indices = DMIGrid.cell_ids_to_indices([record.cell_id for record in records])
+        except (ValueError, TypeError):
+            grid_indices = None
 
-            param_data.append(line)
+        return records, grid_indices
 
-        return param_data
-    
 
-    def get_all_data(dmi_file, param):
+    def get_cell_index(dmi_file, param):
         """
-        Takes a DMI climate grid file,  an open rasterio object and a parameter string corresponging to a DMI climate grid parameter.
-        Returns a list of the JSON strings which have overlapping bounds with the geotiff.
-        If no data overlaps, returns False.
+        Builds a spatial index over the cell geometries of a parameter in a DMI climate grid file.
+        Used for cells that are not on the DMI grid, grid cells are looked up through their cellIds.
+        The index is cached per file, parameter and file modification time.
+
+        Returns:
+        - tree (shapely.STRtree): index over the cell polygons in EPSG:4326, None if the parameter is not in the file
+        - records (list of DMIRecord): records matching the geometries in the tree
         """
+        return DMITools._cached_cell_index(dmi_file, param, os.path.getmtime(dmi_file))
 
-        def process_line(line, param):
-            if not param in line: return
-            return str(json.loads(line)).replace("'", '"')
-            #string formatting required to return what would otherwise be a dict object to json readable string
 
-        with open(dmi_file, 'r') as file:
-               lines = [line.rstrip() for line in file]
+    @lru_cache(maxsize=16)
+    def _cached_cell_index(dmi_file, param, mtime):
+        records, _ = DMITools.get_cell_records(dmi_file, param)
+        if not records:
+            return None, records
 
-        param_data = []
-        for line in lines:
-            result = process_line(line, param)
+        return STRtree([Polygon(record.bbox[0]) for record in records]), records
+    
 
-            if not result == None: param_data.append(result)
+    def get_parameter_specific_data(dmi_file, param):
+        """
+        Takes a DMI climate grid file and a parameter string corresponging to a DMI climate grid parameter.
+        Returns a list of the DMIRecords of that parameter.
+        """
+        return list(DMIRecords.iter_records(dmi_file, params = [param]))
+    
 
-        return param_data
+    def get_all_data(dmi_file, param):
+        """
+        Takes a DMI climate grid file and a parameter string corresponging to a DMI climate grid parameter.
+        Returns a list of the DMIRecords of that parameter.
+        """
+        return DMITools.get_parameter_specific_data(dmi_file, param)
     
     
-    def check_bbox_intersection(raster_bounds, json_str):
+    def check_bbox_intersection(raster_bounds, record):
         """
         Check if a bounding box intersects with a GeoTIFF raster.
 
         Parameters:
-        - raster bounds (str): bounds of a raster file. Must match crs of bbox
-        - json_str (str): json string from DMI with bounding box coordinates in the format 
-                        '[[[lng1, lat1], [lng2, lat2], ..., [lng1, lat1]]]'.
+        - raster bounds (shapely geometry): bounds of a raster file. Must match crs of bbox
+        - record (DMIRecord): DMI record with bounding box coordinates in the format 
+                        [[[lng1, lat1], [lng2, lat2], ..., [lng1, lat1]]].
 
         Returns:
         - bool: True if the bounding box intersects with the raster, False otherwise.
         """
 
-        bbox_str = DMITools.get_bbox(json_str)[0]
-        return Polygon(bbox_str).intersects(raster_bounds)
+        bbox = DMITools.get_bbox(record)[0]
+        return Polygon(bbox).intersects(raster_bounds)
 
 
     def convert_bbox_to_geotiff_crs(src, bbox_4326):
@@ -190,15 +206,20 @@ class DMITools:
         transformer = Transformer.from_crs("EPSG:4326", src_crs, always_xy=True)
         return [list(transformer.transform(lon, lat)) for lon, lat in bbox_4326]
     
-    def convert_jsons_to_bbox_val(dmi_jsons):
-        dmi_tuples = []
-        for dmi_json in dmi_jsons:
-            dmi_json = json.loads(dmi_json)
-            bbox = DMITools.get_bbox(dmi_json)
-            value = DMITools.get_value(dmi_json)
-            dmi_tuples.append((bbox, value))
+    def convert_records_to_bbox_val(dmi_records):
+        """
+        Takes a list of DMIRecords
+        Returns a list of (bbox, value) tuples
+        """
+        return [(record.bbox, record.value) for record in dmi_records]
 
-        return dmi_tuples
+
+    def convert_records_to_cell_val(dmi_records):
+        """
+        Takes a list of DMIRecords
+        Returns a list of (cellId, value) tuples for use with DMIGrid
+        """
+        return [(record.cell_id, record.value) for record in dmi_records]
 
 
     def json_lines_to_raster(param_filtered_data, output_path):
@@ -208,7 +229,38 @@ class DMITools:
         Parameters:
         - param_filtered_data: list of GeoJSON-like features (dictionaries)
         - output_path: path to the output raster file
+
+        Features with DMI grid cellIds are placed on the grid directly from their cellIds,
+        skipping the polygon projection and rasterization.
         """
+        pixel_size = 100  # 100 meters
+
+        cell_ids = [feature['properties'].get('cellId') for feature in param_filtered_data]
+        try:
+            cell_size, _, _ = DMIGrid.cell_ids_to_indices(cell_ids)
+        except (TypeError, ValueError):
+            cell_size = None
+
+        if cell_size is not None and cell_size % pixel_size == 0:
+            values = [feature['properties']['value'] for feature in param_filtered_data]
+            raster_data, transform = DMIGrid.cells_to_array(cell_ids, values, upsample = cell_size // pixel_size)
+            height, width = raster_data.shape
+
+            with rio.open(
+                output_path,
+                'w',
+                driver='GTiff',
+                height=height,
+                width=width,
+                count=1,
+                dtype=raster_data.dtype,
+                crs=DMIGrid.crs,
+                transform=transform,
+                nodata=0
+            ) as dst:
+                dst.write(raster_data, 1)
+            return
+
         # Prepare lists for geometries and values
         geometries = []
         values = []
@@ -232,9 +284,6 @@ class DMITools:
         all_geometries = unary_union(projected_geometries)
         minx, miny, maxx, maxy = all_geometries.bounds
 
-        # Define resolution
-        pixel_size = 100  # 100 meters
-
         # Compute raster dimensions
         width = int(np.ceil((maxx - minx) / pixel_size))
         height = int(np.ceil((maxy - miny) / pixel_size))
@@ -62,12 +62,10 @@ class ETRasterBuilder:
                 self.dmi_param
                 )
 
-            for j, overlap_line in enumerate(overlapping_data):
-                t2 = time.time()
-                rastertools.localize_geotiff_within_bbox(overlap_line)
+            t2 = time.time()
+            rastertools.localize_records(overlapping_data)
 
-                print(f'Raster {i} / {len(self.et_files)}; Tile {j} / {len(overlapping_data)}, t = {time.time() - t2}', end = '\r')
-                # print(f'{i} / {len(overlapping_data)}')
+            print(f'Raster {i} / {len(self.et_files)}; Tiles {len(overlapping_data)}, t = {time.time() - t2}', end = '\r')
 
             rastertools.constrict_dynamic_range((0, 10))
             rastertools.smooth_nodata_pixels()
@@ -88,12 +86,10 @@ class ETRasterBuilder:
                 self.dmi_param
                 )
 
-            for j, overlap_line in enumerate(overlapping_data):
-                t2 = time.time()
-                rastertools.overwrite_geotiff_within_bbox(overlap_line)
+            t2 = time.time()
+            rastertools.rasterize_records(overlapping_data)
 
-                print(f'Raster {i} / {len(self.et_files)}; Tile {j} / {len(overlapping_data)}, t = {time.time() - t2}', end = '\r')
-                # print(f'{i} / {len(overlapping_data)}')
+            print(f'Raster {i} / {len(self.et_files)}; Tiles {len(overlapping_data)}, t = {time.time() - t2}', end = '\r')
 
             # rastertools.constrict_dynamic_range((0, 10))
             # rastertools.smooth_nodata_pixels()
@@ -3,11 +3,13 @@ from rasterio.mask import mask
 from rasterio.warp import calculate_default_transform, reproject, Resampling
 from rasterio.enums import Resampling
 from shapely.geometry import Polygon
+from affine import Affine
+from functools import lru_cache
 import sys
 import numpy as np
 import os
 from tools.dmi_tools.dmi_tools import DMITools
-from tools.et_tools.json_utils import JSONUtils
+from tools.dmi_tools.dmi_grid import DMIGrid
 
 class RasterTools:
     """
@@ -23,22 +25,20 @@ class RasterTools:
         self.create_empty_raster()
                 
 
-    def localize_geotiff_within_bbox(self, json_str):
+    def localize_geotiff_within_bbox(self, record):
         """
-        Multiply the area of a raster within a specified bounding box by a numerical value 
+        Multiply the area of a raster within the bounding box of a DMI record by the record value 
         and overwrite the original GeoTIFF with the processed data.
 
         Parameters:
-        - geotiff_file (str): Path to the GeoTIFF file.
-        - bbox_str (str): Bounding box coordinates in the format 
-                        '[[[lng1, lat1], [lng2, lat2], ..., [lng1, lat1]]]'.
-        - multiplier (float): The value to multiply the raster values by within the bounding box.
+        - record (DMIRecord): Parsed line from a DMI climate grid file with bounding box coordinates
+                        in the format [[[lng1, lat1], [lng2, lat2], ..., [lng1, lat1]]] and a value.
         """
         
         with rio.open(self.input_path, 'r') as src:
             nodata = src.nodata
                 
-            bbox_str = JSONUtils.get_bbox(json_str)[0]
+            bbox_str = record.bbox[0]
             bbox_str = DMITools.convert_bbox_to_geotiff_crs(src, bbox_str)
             bbox_polygon = Polygon(bbox_str)
      
@@ -52,7 +52,7 @@ class RasterTools:
         
         out_image = np.where(
             out_image != nodata, 
-            (out_image * JSONUtils.get_value(json_str) / 10000.0).astype('float32'), 
+            (out_image * record.value / 10000.0).astype('float32'), 
             nodata
             )
 
@@ -63,19 +63,19 @@ class RasterTools:
             dst.write(original_data, window=window)
 
 
-    def overwrite_geotiff_within_bbox(self, json_str):
+    def overwrite_geotiff_within_bbox(self, record):
         """
         Overwrite the area of a raster within a specified bounding box with a new data value 
         and save it to the output GeoTIFF. This creates a raster equivalent of the DMI data
 
         Parameters:
-        - json_str (str): JSON string from a DMI climate grid file containing bounding box and value.
+        - record (DMIRecord): Parsed line from a DMI climate grid file containing bounding box and value.
         """
         
         with rio.open(self.input_path, 'r') as src:
             nodata = src.nodata
                 
-            bbox_str = JSONUtils.get_bbox(json_str)[0]
+            bbox_str = record.bbox[0]
             bbox_str = DMITools.convert_bbox_to_geotiff_crs(src, bbox_str)
             bbox_polygon = Polygon(bbox_str)
     
@@ -84,7 +84,7 @@ class RasterTools:
             except Exception:
                 return
         
-        new_value = JSONUtils.get_value(json_str)
+        new_value = record.value
         out_image = np.full(out_image.shape, new_value, dtype='float32')
 
         with rio.open(self.output_path, 'r+') as dst:
@@ -94,6 +94,87 @@ class RasterTools:
             dst.write(original_data, window=window)
 
 
+    def rasterize_records(self, records, band = 1):
+        """
+        Writes the values of DMI records to the output raster in one pass instead of one window per cell.
+        This creates a raster equivalent of the DMI data on the grid of the input raster.
+
+        Each pixel gets the value of the DMI cell containing its center, pixels outside all cells are left as they are.
+        The map from pixels to cells is cached per grid and cell set, so scenes on the same grid
+        only need a lookup per date.
+
+        Parameters:
+        - records (list of DMIRecord): records of one parameter and date
+        """
+        if not records:
+            return
+
+        with rio.open(self.output_path, 'r+') as dst:
+            labels = RasterTools.get_label_grid(
+                dst.crs.to_wkt(),
+                tuple(dst.transform),
+                (dst.height, dst.width),
+                tuple(record.cell_id for record in records)
+            )
+
+            values = np.array([np.nan if record.value is None else record.value for record in records], dtype='float32')
+            inside = labels >= 0
+
+            data = dst.read(band)
+            data[inside] = values[labels[inside]]
+            dst.write(data, band)
+
+
+    def localize_records(self, records, band = 1):
+        """
+        Multiplies the input raster by the values of DMI records in one pass and writes the result to the output raster.
+        Each pixel is scaled by the value of the DMI cell containing its center, see rasterize_records.
+
+        Parameters:
+        - records (list of DMIRecord): records of one parameter and date
+        """
+        if not records:
+            return
+
+        with rio.open(self.input_path, 'r') as src:
+            data = src.read(band)
+            nodata = src.nodata
+            labels = RasterTools.get_label_grid(
+                src.crs.to_wkt(),
+                tuple(src.transform),
+                (src.height, src.width),
+                tuple(record.cell_id for record in records)
+            )
+
+        values = np.array([np.nan if record.value is None else record.value for record in records], dtype='float32')
+        inside = labels >= 0
+        if nodata is not None:
+            inside &= ~np.isnan(data) if np.isnan(nodata) else data != nodata
+
+        with rio.open(self.output_path, 'r+') as dst:
+            output = dst.read(band)
+            output[inside] = data[inside] * values[labels[inside]] / 10000.0
+            dst.write(output, band)
+
+
+    @lru_cache(maxsize=8)
+    def get_label_grid(crs_wkt, transform, shape, cell_ids):
+        """
+        Maps each pixel of a raster grid to the DMI grid cell containing its center, see DMIGrid.label_grid.
+        Works for any DMI grid resolution, the cost depends on the number of pixels and not the number of cells.
+
+        Parameters:
+        - crs_wkt (str): CRS of the raster grid
+        - transform (tuple): affine transform of the raster grid
+        - shape (tuple): (height, width) of the raster grid
+        - cell_ids (tuple of str): DMI grid cellIds
+
+        Returns:
+        - labels (numpy array): index into cell_ids for each pixel, -1 outside all cells
+        """
+        return DMIGrid.label_grid(cell_ids, crs_wkt, Affine(*transform[:6]), shape)
+
+
     def constrict_dynamic_range(self, range, band = 1):
         """
         Sets all data outside of range to nodata on the destination raster
@@ -168,24 +249,28 @@ class RasterTools:
             nodata_value = dst.nodata
             height, width = data.shape
 
+            # Rasters without interior pixels have nothing to smooth
+            if height < 3 or width < 3:
+                return
+
             smoothed_data = data.copy()
 
             # Offsets to get the neighboring pixels
             offsets = [(-1, 0), (1, 0), (0, -1), (0, 1),  # direct neighbors
                     (-1, -1), (-1, 1), (1, -1), (1, 1)]  # diagonal neighbors
 
-            for y in range(1, height - 1):
-                for x in range(1, width - 1):
-                    if data[y, x] == nodata_value:
-
-                        neighbor_values = []
-                        for dy, dx in offsets:
-                            neighbor_val = data[y + dy, x + dx]
-                            if neighbor_val != nodata_value:
-                                neighbor_values.append(neighbor_val)
-
-                        if len(neighbor_values) >= 2:
-                            smoothed_data[y, x] = np.mean(neighbor_values)
+            # Sum and count the valid neighbours of all interior pixels at once, one shifted view per offset
+            valid = data != nodata_value
+            neighbor_sums = np.zeros((height - 2, width - 2))
+            neighbor_counts = np.zeros((height - 2, width - 2), dtype=int)
+            for dy, dx in offsets:
+                neighbor_data = data[1 + dy:height - 1 + dy, 1 + dx:width - 1 + dx]
+                neighbor_valid = valid[1 + dy:height - 1 + dy, 1 + dx:width - 1 + dx]
+                neighbor_sums += np.where(neighbor_valid, neighbor_data, 0)
+                neighbor_counts += neighbor_valid
+
+            fill = ~valid[1:-1, 1:-1] & (neighbor_counts >= 2)
+            smoothed_data[1:-1, 1:-1][fill] = neighbor_sums[fill] / neighbor_counts[fill]
 
             dst.write(smoothed_data, 1)
 
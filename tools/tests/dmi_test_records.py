@@ -0,0 +1,48 @@
+"""Builders for DMI climate grid features and day files used by the tools tests."""
+import json
+import os
+from datetime import datetime, timedelta
+
+
+BBOX = [[[8.3683, 55.4046], [8.5262, 55.4053], [8.5252, 55.4952], [8.3669, 55.4945], [8.3683, 55.4046]]]
+
+
+def feature(
+    time_from,
+    value=1.0,
+    cell_id="10km_615_66",
+    parameter_id="pot_evaporation_makkink",
+    time_resolution="day",
+    created="2023-05-21T01:44:07.604917+00:00",
+    qc_status="manual",
+):
+    """Returns a feature in the layout of the DMI climate grid files.
+    time_from is an ISO timestamp, a YYYY-MM-DD day or a datetime, to is an hour or a day later."""
+    if isinstance(time_from, str):
+        time_from = datetime.fromisoformat(time_from if "T" in time_from else time_from + "T00:00:00+00:00")
+    time_to = time_from + (timedelta(hours=1) if time_resolution == "hour" else timedelta(days=1))
+
+    return {
+        "geometry": {"coordinates": BBOX, "type": "Polygon"},
+        "properties": {
+            "cellId": cell_id,
+            "created": created,
+            "from": time_from.isoformat(),
+            "parameterId": parameter_id,
+            "qcStatus": qc_status,
+            "timeResolution": time_resolution,
+            "to": time_to.isoformat(),
+            "value": value,
+        },
+        "type": "Feature",
+        "id": None,
+    }
+
+
+def write_day_file(directory, day, features):
+    """Writes features to directory/YYYY-MM-DD.txt and returns its path."""
+    path = os.path.join(directory, f"{day}.txt")
+    with open(path, "w") as file:
+        for line_feature in features:
+            file.write(json.dumps(line_feature) + "\n")
+    return path
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from tools.dmi_tools.dmi_aggregator import DMIAggregator
+from tools.dmi_tools.dmi_records import DMIRecords
+
+from dmi_test_records import feature, write_day_file
+
+
+def hourly_features(day, hours=24, value=1.0):
+    return [feature(day + timedelta(hours=hour), value, parameter_id="mean_temp", time_resolution="hour") for hour in range(hours)]
+
+
+class TestAggregateFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.raw_dir = os.path.join(self.tmp.name, "raw")
+        self.output_dir = os.path.join(self.tmp.name, "daily")
+        os.makedirs(self.raw_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_utc_days(self, first_day, days):
+        """Writes one hourly file per UTC day, the layout of DMI downloads."""
+        for i in range(days):
+            day = first_day + timedelta(days=i)
+            write_day_file(self.raw_dir, day.date().isoformat(), hourly_features(day))
+
+    def aggregate(self, aggregator):
+        dmi_files = sorted(os.path.join(self.raw_dir, name) for name in os.listdir(self.raw_dir))
+        written = aggregator.aggregate_files(dmi_files, self.output_dir)
+        return {os.path.basename(path): list(DMIRecords.iter_records(path)) for path in written}
+
+    def test_partial_edge_days_are_left_out(self):
+        # UTC days 2023-05-01 to 2023-05-03 cover 02:00 May 1 to 02:00 May 4 local time
+        self.write_utc_days(datetime(2023, 5, 1, tzinfo=timezone.utc), 3)
+
+        daily = self.aggregate(DMIAggregator(aggregations={"mean_temp": "sum"}))
+
+        self.assertEqual(sorted(daily), ["2023-05-02.txt", "2023-05-03.txt"])
+        self.assertEqual([record.value for record in daily["2023-05-02.txt"]], [24.0])
+
+    def test_daylight_saving_days_need_23_hours(self):
+        # Summer time starts on 2023-03-26, the local day is 23 hours long
+        self.write_utc_days(datetime(2023, 3, 25, tzinfo=timezone.utc), 3)
+
+        daily = self.aggregate(DMIAggregator(aggregations={"mean_temp": "sum"}))
+
+        self.assertEqual(sorted(daily), ["2023-03-26.txt", "2023-03-27.txt"])
+        self.assertEqual([record.value for record in daily["2023-03-26.txt"]], [23.0])
+
+    def test_min_count_keeps_partial_days(self):
+        self.write_utc_days(datetime(2023, 5, 1, tzinfo=timezone.utc), 3)
+
+        daily = self.aggregate(DMIAggregator(aggregations={"mean_temp": "sum"}, min_count=1))
+
+        self.assertEqual(sorted(daily), ["2023-05-01.txt", "2023-05-02.txt", "2023-05-03.txt", "2023-05-04.txt"])
+        self.assertEqual([record.value for record in daily["2023-05-01.txt"]], [22.0])
+        self.assertEqual([record.value for record in daily["2023-05-04.txt"]], [2.0])
+
+
+class TestAggregateRevisions(unittest.TestCase):
+    def test_revisions_of_an_hour_are_counted_once(self):
+        # Local day 2023-05-02 runs from 22:00 UTC on May 1
+        start = datetime(2023, 5, 1, 22, tzinfo=timezone.utc)
+        features = hourly_features(start, hours=23)
+        features.append(feature(start + timedelta(hours=5), 10.0, parameter_id="mean_temp", time_resolution="hour",
+                                created="2023-06-01T00:00:00+00:00"))
+        records = [DMIRecords.from_feature(line_feature) for line_feature in features]
+
+        self.assertEqual(DMIAggregator(aggregations={"mean_temp": "sum"}).aggregate(records), [])
+
+        records += [DMIRecords.from_feature(feature(start + timedelta(hours=23), 1.0, parameter_id="mean_temp", time_resolution="hour"))]
+        daily = DMIAggregator(aggregations={"mean_temp": "sum"}).aggregate(records)
+
+        self.assertEqual([record.value for record in daily], [33.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from tools.dmi_tools.dmi_catalog import DMICatalog
+
+from dmi_test_records import feature, write_day_file
+
+
+class TestDMICatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dmi_file = write_day_file(self.tmp.name, "2023-05-02", [
+            feature("2023-05-02", 1.0, cell_id="10km_615_66"),
+            feature("2023-05-02", 2.0, cell_id="10km_621_51"),
+        ])
+
+        # A compressed copy of the same day with one cell less
+        with gzip.open(self.dmi_file + ".gz", "wt") as file:
+            with open(self.dmi_file) as source:
+                file.write(source.readline())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_copies_of_a_day_keep_their_own_summary(self):
+        catalog = DMICatalog(self.tmp.name, processes=1)
+
+        self.assertEqual(sorted(summary["cells"] for summary in catalog.files.values()), [1, 2])
+        self.assertEqual(catalog.dates(), ["2023-05-02"])
+        self.assertEqual(catalog.get_summary("2023-05-02")["cells"], 2)
+
+    def test_removed_files_are_dropped_from_the_saved_catalog(self):
+        DMICatalog(self.tmp.name, processes=1)
+        os.remove(self.dmi_file)
+
+        catalog = DMICatalog(self.tmp.name, refresh=False)
+        self.assertEqual(catalog.refresh(), [])
+        self.assertEqual(DMICatalog(self.tmp.name, refresh=False).get_summary("2023-05-02")["cells"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
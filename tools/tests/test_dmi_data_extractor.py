@@ -0,0 +1,53 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from tools.dmi_tools.dmi_data_extractor import climate_data_searcher
+
+from dmi_test_records import feature, write_day_file
+
+
+CELLS = ["10km_615_66", "10km_621_51"]
+PARAMS = ["pot_evaporation_makkink", "mean_temp"]
+
+
+class TestGetSeries(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for day_index, day in enumerate(["2023-05-01", "2023-05-02"]):
+            write_day_file(self.tmp.name, day, [
+                feature(day, 100 * day_index + 10 * cell_index + param_index, cell_id=cell_id, parameter_id=param)
+                for cell_index, cell_id in enumerate(CELLS)
+                for param_index, param in enumerate(PARAMS)
+            ])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_series(self):
+        searcher = climate_data_searcher(self.tmp.name)
+        dates, values = searcher.get_series(PARAMS, CELLS, "2023-05-01", "2023-05-02")
+
+        self.assertEqual(values.shape, (2, 2, 2))
+        np.testing.assert_array_equal(values[1], [[100, 101], [110, 111]])
+
+    def test_filters_apply_like_the_other_lookups(self):
+        searcher = climate_data_searcher(self.tmp.name, filter_params=["mean_temp"], filter_tiles=["10km_621_51"])
+        dates, values = searcher.get_series(PARAMS, CELLS, "2023-05-01", "2023-05-02")
+
+        for i, date in enumerate(dates):
+            for j, cell in enumerate(CELLS):
+                for k, param in enumerate(PARAMS):
+                    expected = searcher.search_climate_file(searcher.find_climate_file(date), param, cell)
+                    if expected is None:
+                        self.assertTrue(np.isnan(values[i, j, k]))
+                    else:
+                        self.assertEqual(values[i, j, k], expected)
+
+        np.testing.assert_array_equal(values[:, 1, 1], [11, 111])
+        self.assertEqual(int(np.isnan(values).sum()), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
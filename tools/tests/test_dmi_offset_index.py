@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tools.dmi_tools.dmi_offset_index import DMIOffsetIndex
+from tools.dmi_tools.dmi_records import DMIRecords
+
+from dmi_test_records import feature, write_day_file
+
+
+CELLS = ["10km_615_66", "10km_621_51", "10km_619_46"]
+PARAMS = ["pot_evaporation_makkink", "mean_temp"]
+
+
+class TestDMIOffsetIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        features = [
+            feature("2023-05-02", 10 * i + j, cell_id=cell_id, parameter_id=param)
+            for i, cell_id in enumerate(CELLS)
+            for j, param in enumerate(PARAMS)
+        ]
+        # A later revision of one value, written before the original
+        features.insert(0, feature("2023-05-02", 99.0, cell_id="10km_621_51", created="2023-06-01T00:00:00+00:00"))
+        self.dmi_file = write_day_file(self.tmp.name, "2023-05-02", features)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_index_is_saved_and_reused(self):
+        DMIOffsetIndex(self.dmi_file)
+        self.assertTrue(os.path.exists(self.dmi_file + ".idx.npz"))
+
+        with mock.patch.object(DMIOffsetIndex, "build", side_effect=AssertionError("index was rebuilt")):
+            DMIOffsetIndex(self.dmi_file)
+
+    def test_lookups_match_a_full_scan(self):
+        index = DMIOffsetIndex(self.dmi_file)
+
+        scanned = {}
+        for record in DMIRecords.iter_records(self.dmi_file):
+            scanned.setdefault((record.parameter_id, record.cell_id), []).append(record)
+
+        self.assertEqual(sorted(index.keys()), sorted(scanned))
+        self.assertEqual(index.get_records(list(scanned)), scanned)
+        for (param, cell), records in scanned.items():
+            self.assertEqual(index.get_value(param, cell), DMIRecords.revision_value(records))
+
+        self.assertEqual(index.get_value("pot_evaporation_makkink", "10km_621_51"), 99.0)
+        self.assertIsNone(index.get_value("pot_evaporation_makkink", "10km_000_00"))
+
+    def test_stale_index_is_rebuilt(self):
+        DMIOffsetIndex(self.dmi_file)
+
+        with open(self.dmi_file, "a") as file:
+            file.write(DMIRecords.to_json(DMIRecords.from_feature(feature("2023-05-02", 5.0, cell_id="10km_600_50"))) + "\n")
+
+        index = DMIOffsetIndex(self.dmi_file)
+        self.assertEqual(index.get_value("pot_evaporation_makkink", "10km_600_50"), 5.0)
+
+    def test_changed_modification_time_invalidates_the_index(self):
+        DMIOffsetIndex(self.dmi_file)
+        stats = os.stat(self.dmi_file)
+        os.utime(self.dmi_file, ns=(stats.st_atime_ns, stats.st_mtime_ns + 10 ** 9))
+
+        with mock.patch.object(DMIOffsetIndex, "build", autospec=True, side_effect=DMIOffsetIndex.build) as build:
+            DMIOffsetIndex(self.dmi_file)
+        build.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
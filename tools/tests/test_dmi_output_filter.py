@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+import unittest
+
+from tools.dmi_tools.dmi_output_filter import dmi_climate_data_parser
+from tools.dmi_tools.dmi_store import DMIStore
+
+from dmi_test_records import feature, write_day_file
+
+
+DAYS = ["2023-05-01", "2023-05-02", "2023-05-03"]
+
+
+class TestIncrementalParsing(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.raw_dir = os.path.join(self.tmp.name, "raw")
+        self.output_dir = os.path.join(self.tmp.name, "filtered")
+        os.makedirs(self.raw_dir)
+        for day in DAYS:
+            self.write_day(day, 1.0)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_day(self, day, value):
+        return write_day_file(self.raw_dir, day, [
+            feature(day, value, parameter_id="pot_evaporation_makkink"),
+            feature(day, value, parameter_id="mean_temp"),
+        ])
+
+    def parse(self, partition_by=None, parameterId=("pot_evaporation_makkink",)):
+        parser = dmi_climate_data_parser(self.raw_dir, self.output_dir, partition_by=partition_by, parameterId=list(parameterId))
+        return sorted(os.path.basename(result.file) for result in parser.parse_files(incremental=True))
+
+    def test_unchanged_files_are_skipped(self):
+        self.assertEqual(self.parse(), [f"{day}.txt" for day in DAYS])
+        self.assertEqual(self.parse(), [])
+
+    def test_modified_files_are_parsed_again(self):
+        self.parse()
+        self.write_day("2023-05-02", 12.5)
+
+        self.assertEqual(self.parse(), ["2023-05-02.txt"])
+        with open(os.path.join(self.output_dir, "2023-05-02.txt")) as file:
+            self.assertEqual([json.loads(line)["properties"]["value"] for line in file], [12.5])
+
+    def test_changed_filter_parses_everything_again(self):
+        self.parse()
+        self.assertEqual(self.parse(parameterId=("mean_temp",)), [f"{day}.txt" for day in DAYS])
+        self.assertEqual(self.parse(parameterId=("mean_temp",)), [])
+
+    def test_removed_files_are_pruned(self):
+        self.parse()
+        os.remove(os.path.join(self.raw_dir, "2023-05-01.txt"))
+
+        self.assertEqual(self.parse(), [])
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "2023-05-01.txt")))
+        with open(os.path.join(self.output_dir, "_parser_state.json")) as file:
+            self.assertEqual(len(json.load(file)["files"]), 2)
+
+    def test_changed_partitioning_rebuilds_the_store(self):
+        self.parse(partition_by=("parameterId", "year", "month"))
+        self.assertEqual(self.parse(partition_by=("cellId", "year")), [f"{day}.txt" for day in DAYS])
+
+        store = DMIStore(self.output_dir, ("cellId", "year"))
+        self.assertEqual(list(store.index["partitions"]), ["cellId=10km_615_66/year=2023/part.npz"])
+        self.assertEqual(len(store.read()["value"]), len(DAYS))
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "parameterId=pot_evaporation_makkink")))
+
+
+if __name__ == "__main__":
+    unittest.main()
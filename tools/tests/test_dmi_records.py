@@ -0,0 +1,61 @@
+import unittest
+
+from tools.dmi_tools.dmi_records import DMIRecords
+
+from dmi_test_records import feature
+
+
+def revision(value, created, qc_status="manual"):
+    return DMIRecords.from_feature(feature("2023-05-02", value, created=created, qc_status=qc_status))
+
+
+class TestRevisions(unittest.TestCase):
+    def test_newer_created_wins(self):
+        older = revision(1.0, "2023-05-03T00:00:00+00:00")
+        newer = revision(2.0, "2023-06-01T00:00:00+00:00")
+
+        for prefer in ("latest", "qc"):
+            self.assertTrue(DMIRecords.is_newer_revision(newer, older, prefer))
+            self.assertFalse(DMIRecords.is_newer_revision(older, newer, prefer))
+
+        records, superseded = DMIRecords.deduplicate([newer, older])
+        self.assertEqual([record.value for record in records], [2.0])
+        self.assertEqual(superseded, 1)
+
+    def test_equal_created_with_different_qc(self):
+        created = "2023-05-03T00:00:00+00:00"
+        manual = revision(1.0, created, "manual")
+        automatic = revision(2.0, created, "automatic")
+
+        # 'latest' keeps the first seen of equally new revisions, 'qc' the best qcStatus
+        self.assertFalse(DMIRecords.is_newer_revision(automatic, manual, "latest"))
+        self.assertFalse(DMIRecords.is_newer_revision(manual, automatic, "latest"))
+        self.assertTrue(DMIRecords.is_newer_revision(manual, automatic, "qc"))
+        self.assertFalse(DMIRecords.is_newer_revision(automatic, manual, "qc"))
+
+        self.assertEqual(DMIRecords.deduplicate([automatic, manual], "latest")[0][0].value, 2.0)
+        self.assertEqual(DMIRecords.deduplicate([automatic, manual], "qc")[0][0].value, 1.0)
+
+    def test_better_qc_wins_over_newer_created(self):
+        manual = revision(1.0, "2023-05-03T00:00:00+00:00", "manual")
+        automatic = revision(2.0, "2023-06-01T00:00:00+00:00", "automatic")
+
+        self.assertEqual(DMIRecords.deduplicate([manual, automatic], "latest")[0][0].value, 2.0)
+        self.assertEqual(DMIRecords.deduplicate([manual, automatic], "qc")[0][0].value, 1.0)
+
+    def test_missing_created_is_oldest(self):
+        undated = revision(1.0, None)
+        dated = revision(2.0, "2023-05-03T00:00:00+00:00")
+
+        self.assertTrue(DMIRecords.is_newer_revision(dated, undated))
+        self.assertFalse(DMIRecords.is_newer_revision(undated, dated))
+        self.assertEqual(DMIRecords.deduplicate([dated, undated])[0][0].value, 2.0)
+        self.assertEqual(DMIRecords.deduplicate([undated, revision(3.0, None)])[0][0].value, 1.0)
+
+    def test_unknown_preference(self):
+        with self.assertRaises(ValueError):
+            DMIRecords.is_newer_revision(revision(1.0, None), revision(2.0, None), "newest")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from tools.csv_tools.dmi_site_csv_extractor import extract_site_series
+
+from dmi_test_records import feature, write_day_file
+
+
+class TestExtractSiteSeries(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for day, values in [("2023-05-01", (1.0, 2.0)), ("2023-05-02", (3.0, 4.0))]:
+            write_day_file(self.tmp.name, day, [
+                feature(day, value, cell_id=cell_id) for cell_id, value in zip(["10km_615_66", "10km_621_51"], values)
+            ])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_sites_in_one_cell_get_the_same_series(self):
+        site_cells = {"soroe": "10km_615_66", "voulund": "10km_621_51", "soroe_2": "10km_615_66"}
+
+        dates, values = extract_site_series(self.tmp.name, site_cells, "pot_evaporation_makkink", "2023-05-01", "2023-05-03")
+
+        self.assertEqual(len(dates), 3)
+        np.testing.assert_array_equal(values[:2], [[1.0, 2.0, 1.0], [3.0, 4.0, 3.0]])
+        self.assertTrue(np.isnan(values[2]).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
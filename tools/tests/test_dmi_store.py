@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from tools.dmi_tools.dmi_records import DMIRecords
+from tools.dmi_tools.dmi_store import DMIStore
+
+from dmi_test_records import feature
+
+
+DAYS = ["2023-04-30", "2023-05-01", "2023-05-02"]
+CELLS = ["10km_615_66", "10km_621_51"]
+PARAMS = ["pot_evaporation_makkink", "mean_temp"]
+
+
+def day_records(day, offset=0.0):
+    return [
+        DMIRecords.from_feature(feature(day, offset + 10 * i + j, cell_id=cell_id, parameter_id=param))
+        for i, cell_id in enumerate(CELLS)
+        for j, param in enumerate(PARAMS)
+    ]
+
+
+class TestDMIStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store_dir = os.path.join(self.tmp.name, "store")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, partition_by=("parameterId", "year", "month")):
+        store = DMIStore(self.store_dir, partition_by)
+        for day in DAYS:
+            store.write_staging(day_records(day), day)
+        store.compact()
+        return store
+
+    def test_round_trip(self):
+        store = self.build()
+
+        records = store.read_records()
+        self.assertEqual(len(records), len(DAYS) * len(CELLS) * len(PARAMS))
+
+        # Timestamps are stored as UTC datetime64, so they come back in another ISO layout
+        def key(record):
+            return datetime.fromisoformat(record.time_from), record.cell_id, record.parameter_id
+
+        expected = {key(record): record for day in DAYS for record in day_records(day)}
+        for record in records:
+            original = expected[key(record)]
+            self.assertEqual(record.value, original.value)
+            self.assertEqual(datetime.fromisoformat(record.time_to), datetime.fromisoformat(original.time_to))
+            self.assertEqual(datetime.fromisoformat(record.created), datetime.fromisoformat(original.created))
+            self.assertEqual(record.qc_status, original.qc_status)
+
+    def test_query_opens_only_matching_partitions(self):
+        store = self.build()
+
+        self.assertEqual(len(store.index["partitions"]), 4)
+        self.assertEqual(store.partitions(parameterId="mean_temp", month=5), ["parameterId=mean_temp/year=2023/month=05/part.npz"])
+
+        columns = store.read(parameterId="mean_temp", cellId="10km_621_51", year=2023, month=5)
+        np.testing.assert_array_equal(columns["date"], np.array(["2023-05-01", "2023-05-02"], dtype="datetime64[D]"))
+        np.testing.assert_array_equal(columns["value"], [11, 11])
+
+    def test_time_keys_outside_the_partitioning_filter_rows(self):
+        store = self.build(("cellId", "year"))
+
+        columns = store.read(cellId="10km_615_66", month=4)
+
+        np.testing.assert_array_equal(np.unique(columns["date"]), np.array(["2023-04-30"], dtype="datetime64[D]"))
+        self.assertEqual(len(columns["value"]), len(PARAMS))
+
+    def test_compact_replaces_days(self):
+        store = self.build()
+        store.write_staging(day_records("2023-05-01", offset=100), "2023-05-01")
+        store.compact()
+
+        columns = DMIStore(self.store_dir).read(parameterId="pot_evaporation_makkink", month=5)
+        np.testing.assert_array_equal(columns["value"], [100, 110, 0, 10])
+
+    def test_empty_partition_is_skipped(self):
+        store = DMIStore(self.store_dir, ("year", "month"))
+        store.write_staging([], "2023-06-01")
+        store.compact()
+
+        self.assertEqual(store.index["partitions"], {})
+        self.assertEqual(len(store.read(year=2023)["value"]), 0)
+
+    def test_unknown_read_key(self):
+        store = self.build()
+        with self.assertRaises(ValueError):
+            store.read(stationId="06184")
+
+    def test_partition_by_mismatch(self):
+        self.build(("parameterId", "year", "month"))
+        with self.assertRaises(ValueError):
+            DMIStore(self.store_dir, ("cellId", "year"))
+
+
+if __name__ == "__main__":
+    unittest.main()